@@ -3,6 +3,85 @@ from enum import Enum, auto
 # List: identifier columns
 list_id_cols = ["DISTRICT", "LOCATION OF SCREENING", "DATESCREEN", "ICNUMBER"]
 
+# List: key columns - identifier columns with `ICNUMBER` encoded as `ic_key` (utils.encode_ic)
+# Used for grouping, windowing, sorting and joins, `ICNUMBER` is kept for display only
+list_key_cols = ["DISTRICT", "LOCATION OF SCREENING", "DATESCREEN", "ic_key"]
+
+# List: columns required by general validation rules, checked by utils.preflight()
+# together with lesion columns (validate.lesion_colmap)
+list_required_cols = [
+  *list_id_cols,
+  "DATEBIRTH",
+  "GENDER CODE",
+  "TELEPHONE NO",
+  "LESION",
+  "HABITS",
+  "REFERAL TO SPECIALIST",
+  "DATE REFERRED",
+  "DATE SEEN BY SPECIALIST",
+  "DATE REFERRED QUIT SER",
+  "TARIKH TEMUJANJI QUIT SERVICE",
+  "TOBACCO",
+  "TOBACCO_ADVISED",
+  "TOBACCO QUIT",
+  "BBETEL QUID CHEWING",
+  "BBETEL QUID CHEWING ADVISED",
+  "BBETEL QUID CHEWING QUIT",
+  "ALCOHOL",
+  "ALCOHOL ADVISED",
+  "ALCOHOL QUIT",
+  "REFERRAL TO QUIT SERVICES",
+  "HADIR QUIT SERVICES",
+  "STATUS INTERVENSI",
+  "MEDHIST",
+  "MED HIST SPECIFY",
+  "FAMILY",
+  "FAMILYHSIT SPECIFY",
+  "RELATION",
+  "OCCUPATION",
+  "EDUCATION LEVEL CODE",
+]
+
+# Dict: known aliases of required columns in other versions of the database template
+# Column names differing only in case, spaces or punctuation are mapped without aliases
+dict_col_alias = {
+  "FAMILYHSIT SPECIFY": ["FAMILYHIST SPECIFY", "FAMILY HISTORY SPECIFY"],
+  "BBETEL QUID CHEWING": ["BETEL QUID CHEWING"],
+  "BBETEL QUID CHEWING ADVISED": ["BETEL QUID CHEWING ADVISED"],
+  "BBETEL QUID CHEWING QUIT": ["BETEL QUID CHEWING QUIT"],
+  "REFERAL TO SPECIALIST": ["REFERRAL TO SPECIALIST"],
+}
+
+# List: not-applicable codes, replaced with nulls when REPLACE_NA is set
+list_na_values = ["0 - not applicable", "00 = not applicable"]
+
+# Coded columns: canonical values, used to normalise casing of source data
+list_habit_values = [
+  "0 - No such habit",
+  "1- habit currently practiced",
+  "2 - past habit now has stopped (minimum 6 months)",
+]
+list_yes_no_values = ["Yes", "No"]
+
+dict_coded_values = {
+  "TOBACCO": list_habit_values,
+  "TOBACCO_ADVISED": list_yes_no_values,
+  "TOBACCO QUIT": list_yes_no_values,
+  "BBETEL QUID CHEWING": list_habit_values,
+  "BBETEL QUID CHEWING ADVISED": list_yes_no_values,
+  "BBETEL QUID CHEWING QUIT": list_yes_no_values,
+  "ALCOHOL": list_habit_values,
+  "ALCOHOL ADVISED": list_yes_no_values,
+  "ALCOHOL QUIT": list_yes_no_values,
+  "HADIR QUIT SERVICES": ["HADIR", "TIDAK HADIR"],
+  "STATUS INTERVENSI": [
+    "I- SEDANG MENERIMA RAWATAN",
+    "II- GAGAL DATANG TEMUJANJI",
+    "III- GAGAL BERHENTI",
+    "IV- BERJAYA BERHENTI SELAMA 6 BULAN",
+  ],
+}
+
 
 # Rule enums: ../docs/rules.md
 class RuleEnum(Enum):
@@ -41,3 +120,8 @@ class RuleEnum(Enum):
   REFERRAL_QUIT_VS_DATE_REFERRED_VS_FIRST_APPT_DATE = auto()
   ATTEND_FIRST_APPT_NULL_CHECK = auto()
   ATTEND_FIRST_APPT_VS_INTERVENTION_STATUS = auto()
+
+  # Reference data (validate.reference)
+  DISTRICT_VS_REFERENCE = auto()
+  LOCATION_VS_REFERENCE = auto()
+  FILE_STATE_DISTRICT_COMBINATION = auto()
@@ -0,0 +1,65 @@
+import polars as pl
+import pytest
+
+import validate.diff as diff
+
+
+def _write_store(path_store, rule_number: int):
+  path_store.joinpath("general").mkdir(parents=True, exist_ok=True)
+  pl.DataFrame(
+    {
+      "file": ["a"],
+      "DISTRICT": ["D1"],
+      "ICNUMBER": ["900101011234"],
+      "fail": [{"rule_number": rule_number, "rule": "VALID_IC", "data": ["x"]}],
+    },
+    schema={
+      "file": pl.Utf8,
+      "DISTRICT": pl.Utf8,
+      "ICNUMBER": pl.Utf8,
+      "fail": pl.Struct(
+        {"rule_number": pl.Int32, "rule": pl.Utf8, "data": pl.List(pl.Utf8)}
+      ),
+    },
+  ).write_parquet(path_store.joinpath("general/a.parquet"))
+
+
+def test_diff_run_without_failures(tmp_path, monkeypatch):
+  monkeypatch.setattr(diff, "PATH_STORE", str(tmp_path / "store"))
+  monkeypatch.setattr(diff, "PATH_OUTPUT", str(tmp_path))
+
+  _write_store(tmp_path / "store", 2)
+  diff.persist_run("20240101-000000")
+  (tmp_path / "store/general/a.parquet").unlink()
+
+  # no failures left, the run is still persisted and diffed against the previous run
+  diff.persist_run("20240102-000000")
+  assert (tmp_path / "store/runs/20240102-000000").is_dir()
+
+  diff.diff_runs("20240102-000000")
+  assert (tmp_path / "validation_diff_general.xlsx").exists()
+
+
+def test_run_id(tmp_path, monkeypatch):
+  monkeypatch.setattr(diff, "PATH_STORE", str(tmp_path / "store"))
+
+  # runs in the same second are persisted apart
+  run_id = diff.get_run_id()
+  diff.persist_run(run_id)
+  assert diff.get_run_id() != run_id
+
+  with pytest.raises(FileExistsError):
+    diff.persist_run(run_id)
+
+
+def test_diff_joins():
+  lf_previous = pl.LazyFrame({"key_hash": [1, 2], "rule_number": [1, 1]})
+  lf_current = pl.LazyFrame({"key_hash": [2, 3], "rule_number": [1, 1]})
+
+  df_new, df_resolved, df_persisting = pl.collect_all(
+    diff._diff_joins(lf_current, lf_previous)
+  )
+
+  assert df_new["key_hash"].to_list() == [3]
+  assert df_resolved["key_hash"].to_list() == [1]
+  assert df_persisting["key_hash"].to_list() == [2]
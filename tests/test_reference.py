@@ -0,0 +1,24 @@
+import polars as pl
+
+from validate.general import _validate_file_state_district
+from validate.reference import prepare_reference
+
+
+def test_file_state_district():
+  df_reference = prepare_reference(
+    "district",
+    pl.DataFrame({"STATE": ["S1", "S1", "S2"], "DISTRICT": ["D1", " d2", "D3"]}),
+  )
+  lf = pl.LazyFrame(
+    {
+      "file": ["a"] * 4 + ["b"] * 2,
+      "DISTRICT": ["d1", "D1", "D2", None, "D3", "d3 "],
+    }
+  )
+
+  df = _validate_file_state_district(lf, df_reference).collect()
+
+  # one row for each combination of file `a`, file `b` has a single combination
+  assert df["file"].to_list() == ["a", "a", "a"]
+  assert df["state_district"].to_list() == ["S1|D1", "S1|D2", "Null|Null"]
+  assert df["combination_rows"].to_list() == [2, 1, 1]
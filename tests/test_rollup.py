@@ -0,0 +1,33 @@
+from datetime import date
+
+import polars as pl
+
+from constants import RuleEnum
+from validate.rollup import get_failed_cube
+
+
+def _get_df(list_row_id: list[int], lesion: bool) -> pl.DataFrame:
+  n = len(list_row_id)
+  df = pl.DataFrame(
+    {
+      "file": ["a"] * n,
+      "DISTRICT": ["D1"] * n,
+      "LOCATION OF SCREENING": ["K1"] * n,
+      "DATESCREEN": [date(2024, 1, 1)] * n,
+      "ICNUMBER": [None] * n,
+      "ic_key": [None] * n,
+      "row_id": list_row_id,
+      "fail": [{"rule_number": 1, "rule": RuleEnum(1).name, "data": ["x"]}] * n,
+    },
+    schema_overrides={"ICNUMBER": pl.Utf8, "ic_key": pl.Int64, "row_id": pl.UInt32},
+  )
+  if lesion:
+    df = df.with_columns(pl.lit("L1").alias("lesion_id"))
+  return df
+
+
+def test_failed_cube_records():
+  # records with the same keys, e.g. null ICNUMBER, are counted apart
+  assert get_failed_cube(_get_df([0, 1, 2], lesion=False))["failed"].item() == 3
+  # a record failing on two lesions is counted once
+  assert get_failed_cube(_get_df([0, 0, 1], lesion=True))["failed"].item() == 2
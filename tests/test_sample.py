@@ -0,0 +1,47 @@
+import polars as pl
+
+from constants import RuleEnum
+from validate.sample import _stratum_expr, estimate, get_rules, get_sample
+
+
+def test_null_district_stratum():
+  df = pl.DataFrame({"DISTRICT": ["D1", "D1", None, " ", None, "D2"]})
+
+  df_sample = get_sample(df, fraction=1, stratify=True)
+
+  df_null = df_sample.filter(pl.col("stratum") == "(null)")
+  assert df_null.height == 3
+  assert df_null["population"].to_list() == [3, 3, 3]
+
+
+def test_estimate_null_district():
+  rule_number = RuleEnum.LESION_COLS_COMPLETENESS.value
+  df = pl.DataFrame({"DISTRICT": ["D1"] * 10 + [None] * 90})
+
+  df_sample = get_sample(df, fraction=1, stratify=True)
+  df_strata = df_sample.group_by("stratum").agg(
+    pl.lit("a").alias("file"),
+    pl.col("population").first().cast(pl.Int64),
+    pl.count().cast(pl.Int64).alias("sampled"),
+  )
+  # every row fails, grouped from validated rows as in `run_sample()`
+  df_failed = (
+    df.select(
+      pl.lit("a").alias("file"),
+      _stratum_expr(True).alias("stratum"),
+      pl.lit(rule_number, dtype=pl.Int32).alias("rule_number"),
+    )
+    .group_by("file", "stratum", "rule_number")
+    .agg(pl.count().cast(pl.Int64).alias("failed"))
+  )
+
+  df_rules = get_rules("a", [RuleEnum.LESION_COLS_COMPLETENESS, RuleEnum.VALID_IC])
+
+  df_estimate = estimate(df_strata, df_failed, df_rules, by=[])
+
+  # rules not run are left out
+  assert df_estimate["rule_number"].to_list() == [RuleEnum.VALID_IC.value, rule_number]
+  df_estimate = df_estimate.filter(pl.col("rule_number") == rule_number)
+
+  assert df_estimate["failed"].item() == 100
+  assert df_estimate["rate"].item() == 1
@@ -0,0 +1,75 @@
+import polars as pl
+
+import validate.scheduler as scheduler
+from constants import RuleEnum
+from validate.general import ValidationGeneral
+from validate.store import ValidationStore, store_data
+
+
+def _func_a():
+  pass
+
+
+def _func_b():
+  pass
+
+
+def _func_c():
+  pass
+
+
+def test_order_by_cost(tmp_path, monkeypatch):
+  monkeypatch.setattr(scheduler, "PATH_STORE", str(tmp_path))
+  scheduler._read_stats.cache_clear()
+
+  rule_scheduler = scheduler.RuleScheduler("general")
+  rule_scheduler.add(_func_a, 100, 2.0, 0)
+  rule_scheduler.add(_func_b, 100, 1.0, 0)
+  rule_scheduler.add(_func_c, 100, 1.0, 50)
+  rule_scheduler.save()
+  rule_scheduler.save()
+
+  # stats of another worker
+  monkeypatch.setattr(scheduler, "worker_id", "other:1")
+  rule_scheduler = scheduler.RuleScheduler("general")
+  rule_scheduler.add(_func_b, 100, 5.0, 0)
+  rule_scheduler.save()
+  scheduler.compact_stats()
+  scheduler._read_stats.cache_clear()
+
+  assert [i.name for i in tmp_path.joinpath("rule_stats").iterdir()] == [
+    "compacted.parquet"
+  ]
+  # seconds per row: a 0.02, b 0.023, c 0.01
+  assert scheduler.RuleScheduler("general").order([_func_a, _func_b, _func_c]) == [
+    _func_c,
+    _func_a,
+    _func_b,
+  ]
+  assert scheduler.RuleScheduler("lesion").order([_func_b, _func_a]) == [
+    _func_b,
+    _func_a,
+  ]
+  scheduler._read_stats.cache_clear()
+
+
+def test_store_order():
+  schema = ValidationGeneral.validation_df_schema
+  list_rule_enum = [RuleEnum.VALID_IC, RuleEnum.IC_VS_GENDER]
+  list_func = [
+    store_data(rule_enum, ["file"])(lambda lf: lf) for rule_enum in list_rule_enum
+  ]
+  lf = pl.DataFrame(
+    {col: [None] for col in schema if col != "fail"},
+    schema={col: dtype for col, dtype in schema.items() if col != "fail"},
+  ).lazy()
+
+  # rules run in reverse order, stored in order of `list_rule_enum`
+  store_handler = ValidationStore("general", schema, "a", list_rule_enum)
+  for func in reversed(list_func):
+    assert store_handler.extend_df(func(lf)) == 1
+
+  df = pl.concat(sorted(store_handler.list_df, key=store_handler._get_position))
+  assert df["fail"].struct.field("rule_number").to_list() == [
+    i.value for i in list_rule_enum
+  ]
@@ -0,0 +1,38 @@
+from pathlib import Path
+
+import polars as pl
+import pytest
+
+import utils
+
+list_cols = ["DATESCREEN", "TOBACCO_ADVISED", "FAMILYHSIT SPECIFY", "ICNUMBER"]
+
+
+def _preflight(monkeypatch, schema: dict) -> dict[str, str]:
+  monkeypatch.setattr(utils, "get_schema", lambda path: schema)
+  return utils.preflight(Path("a.accdb"), list_cols)
+
+
+def test_preflight_mapping(monkeypatch):
+  schema = {
+    "DATESCREEN": pl.Datetime,
+    "Tobacco Advised": pl.Utf8,  # normalised name
+    "FAMILY HISTORY SPECIFY": pl.Utf8,  # alias
+    "ICNUMBER": pl.Utf8,
+  }
+
+  assert _preflight(monkeypatch, schema) == {
+    "Tobacco Advised": "TOBACCO_ADVISED",
+    "FAMILY HISTORY SPECIFY": "FAMILYHSIT SPECIFY",
+  }
+
+
+def test_preflight_rejected(monkeypatch):
+  schema = {
+    "DATESCREEN": pl.Utf8,
+    "TOBACCO_ADVISED": pl.Utf8,
+    "FAMILYHSIT SPECIFY": pl.Utf8,
+  }
+
+  with pytest.raises(utils.PreflightError, match=r"\['ICNUMBER'\].*DATESCREEN"):
+    _preflight(monkeypatch, schema)
@@ -0,0 +1,55 @@
+import os
+import time
+
+import validate.workqueue as workqueue
+
+
+def _get_lease(tmp_path, monkeypatch):
+  monkeypatch.setattr(workqueue, "PATH_STORE", str(tmp_path))
+  monkeypatch.setattr(workqueue, "LEASE_TIMEOUT", 0.2)
+  path = tmp_path.joinpath("a.accdb")
+  path.write_text("x")
+  return path
+
+
+def test_acquire(tmp_path, monkeypatch):
+  path = _get_lease(tmp_path, monkeypatch)
+
+  lease = workqueue.Lease(path)
+  assert lease.acquire()
+  assert lease.is_owner()
+  # claimed by this worker, not claimed again while fresh
+  assert not workqueue.Lease(path).acquire()
+
+  with lease:
+    time.sleep(0.3)  # heartbeat keeps the lease fresh
+    assert not workqueue.Lease(path).acquire()
+    lease.mark_done()
+
+  assert not lease.lease_path.exists()
+  assert workqueue.is_done(path)
+
+
+def test_stale_take_over(tmp_path, monkeypatch):
+  path = _get_lease(tmp_path, monkeypatch)
+
+  # lease of a dead worker, without heartbeat
+  lease_dead = workqueue.Lease(path)
+  monkeypatch.setattr(workqueue, "worker_id", "dead:1")
+  assert lease_dead.acquire()
+  os.utime(lease_dead.lease_path, (time.time() - 1, time.time() - 1))
+
+  monkeypatch.setattr(workqueue, "worker_id", "live:2")
+  lease = workqueue.Lease(path)
+  assert lease.acquire()
+  assert lease.lease_path.read_text() == "live:2"
+  assert [i.name for i in workqueue.get_queue_dir().iterdir()] == [
+    lease.lease_path.name
+  ]
+
+  # the dead worker does not touch or remove the lease taken over
+  monkeypatch.setattr(workqueue, "worker_id", "dead:1")
+  assert not lease_dead.is_owner()
+  with lease_dead:
+    pass
+  assert lease.lease_path.exists()
@@ -1,7 +1,29 @@
+import os
+import re
+
 import polars as pl
 
 from pathlib import Path
 
+from constants import dict_coded_values, dict_col_alias, list_na_values
+
+PATH_CACHE = os.getenv("PATH_CACHE")
+
+# dtypes of date columns, read as datetime by the ODBC driver
+dict_schema_overrides = {
+  "DATESCREEN": pl.Date,
+  "DATEBIRTH": pl.Date,
+  "DATE REFERRED": pl.Date,
+  "SPECIALIST APPT DATE": pl.Date,
+  "DATE SEEN BY SPECIALIST": pl.Date,
+  "DATE REFERRED QUIT SER": pl.Date,
+  "TARIKH TEMUJANJI QUIT SERVICE": pl.Date,
+}
+
+
+class PreflightError(Exception):
+  """File rejected by `preflight()`."""
+
 
 def _get_conn_str(file_path: Path) -> str:
   driver = "{Microsoft Access Driver (*.mdb, *.accdb)}"
@@ -9,20 +31,227 @@ def _get_conn_str(file_path: Path) -> str:
   return conn_str
 
 
-def get_df(path: Path) -> pl.DataFrame:
+def _read_access(path: Path, rename: dict[str, str] | None = None) -> pl.DataFrame:
+  # `dict_schema_overrides` is keyed by canonical names, source names can differ
+  dict_source_name = {v: k for k, v in (rename or {}).items()}
   df = pl.read_database(
     query="SELECT * FROM [DATA SHEET];",
     connection=_get_conn_str(path),
     execute_options={"max_text_size": 220},  # for long text fields / varchar(max)
     schema_overrides={
-      "DATESCREEN": pl.Date,
-      "DATEBIRTH": pl.Date,
-      "DATE REFERRED": pl.Date,
-      "SPECIALIST APPT DATE": pl.Date,
-      "DATE SEEN BY SPECIALIST": pl.Date,
-      "DATE REFERRED QUIT SER": pl.Date,
-      "TARIKH TEMUJANJI QUIT SERVICE": pl.Date,
+      dict_source_name.get(col, col): dtype
+      for col, dtype in dict_schema_overrides.items()
     },
   )
 
   return df
+
+
+def _read_access_schema(path: Path) -> dict[str, pl.PolarsDataType]:
+  from arrow_odbc import read_arrow_batches_from_odbc
+
+  # no rows are returned, only metadata of the result set is read
+  reader = read_arrow_batches_from_odbc(
+    query="SELECT * FROM [DATA SHEET] WHERE 1=0;",
+    connection_string=_get_conn_str(path),
+    max_text_size=220,
+  )
+
+  return pl.from_arrow(reader.schema.empty_table()).schema
+
+
+def get_cache_path(path: Path) -> Path:
+  """Path of Arrow IPC cache for `path`, keyed by the source file's mtime and size."""
+  stat = path.stat()
+  return Path(PATH_CACHE).joinpath(
+    f"{path.stem}_{stat.st_mtime_ns}_{stat.st_size}.arrow"
+  )
+
+
+def _write_cache(df: pl.DataFrame, path: Path):
+  cache_path = get_cache_path(path)
+  cache_path.parent.mkdir(parents=True, exist_ok=True)
+
+  # remove cache of previous versions of the source file
+  for stale_path in cache_path.parent.glob(f"{path.stem}_*.arrow"):
+    if stale_path.stem.rsplit("_", 2)[0] != path.stem:
+      continue
+    try:
+      os.unlink(stale_path)
+    except PermissionError:
+      # cache can still be memory-mapped, e.g. by an active notebook
+      pass
+
+  # uncompressed so that the cache can be memory-mapped on read
+  tmp_path = cache_path.with_suffix(".tmp")
+  df.write_ipc(tmp_path, compression="uncompressed")
+  os.replace(tmp_path, cache_path)
+
+
+def get_df(
+  path: Path, use_cache: bool = True, rename: dict[str, str] | None = None
+) -> pl.DataFrame:
+  """Reads `[DATA SHEET]` of the Access database in `path`.
+
+  If `PATH_CACHE` is set, the table is cached as an Arrow IPC file on first read,
+  and read back memory-mapped while the source file's mtime and size are unchanged.
+
+  Parameters
+  ----------
+  path
+      Path to Access database file.
+  use_cache
+      Read from / write into the ingestion cache in `PATH_CACHE`.
+  rename
+      Mapping of source to canonical column names, as returned by `preflight()`.
+  """
+  rename = rename or {}
+
+  if not use_cache or PATH_CACHE is None:
+    return _read_access(path, rename).rename(rename)
+
+  cache_path = get_cache_path(path)
+
+  if not cache_path.exists():
+    _write_cache(_read_access(path, rename), path)
+
+  return pl.read_ipc(cache_path, memory_map=True).rename(rename)
+
+
+def get_schema(path: Path) -> dict[str, pl.PolarsDataType]:
+  """Reads column names and dtypes of `[DATA SHEET]` without reading any rows.
+
+  Read from the ingestion cache if the file is cached, otherwise from the metadata of
+  an empty result set. Dtypes are as read from source, before `dict_schema_overrides`.
+  """
+  if PATH_CACHE is not None and get_cache_path(path).exists():
+    return pl.read_ipc_schema(get_cache_path(path))
+
+  return _read_access_schema(path)
+
+
+def _normalize_col_name(col: str) -> str:
+  return re.sub(r"[^A-Z0-9]", "", col.upper())
+
+
+def preflight(path: Path, list_cols: list[str]) -> dict[str, str]:
+  """Checks columns of `[DATA SHEET]` in `path` before the full read in `get_df()`.
+
+  Only metadata is read (`get_schema()`). A required column missing under its name is
+  mapped from a source column with the same normalised name (case, spaces and
+  punctuation ignored) or a known alias (`dict_col_alias`). Columns in
+  `dict_schema_overrides` must be read as date or datetime (or null).
+
+  Returns mapping of source to canonical column names, used as `rename` in `get_df()`.
+
+  Raises PreflightError if a required column is missing or has an incompatible dtype.
+
+  Parameters
+  ----------
+  path
+      Path to Access database file.
+  list_cols
+      Columns required by validation rules.
+  """
+  schema = get_schema(path)
+
+  dict_source_col = {}
+  for col in schema:
+    dict_source_col.setdefault(_normalize_col_name(col), col)
+
+  rename = {}
+  list_missing = []
+  for col in list_cols:
+    if col in schema:
+      continue
+
+    for candidate in [col, *dict_col_alias.get(col, [])]:
+      source_col = dict_source_col.get(_normalize_col_name(candidate))
+      if (
+        source_col is not None
+        and source_col not in rename
+        and source_col not in list_cols
+      ):
+        rename[source_col] = col
+        break
+    else:
+      list_missing.append(col)
+
+  list_invalid_dtype = [
+    f"{col} ({dtype})"
+    for source_col, dtype in schema.items()
+    if (col := rename.get(source_col, source_col)) in dict_schema_overrides
+    and not (dtype.is_temporal() or dtype == pl.Null)
+  ]
+
+  if len(list_missing) > 0 or len(list_invalid_dtype) > 0:
+    raise PreflightError(
+      f"'{path.stem}' rejected by preflight - missing columns: {list_missing}, "
+      f"columns not read as dates: {list_invalid_dtype}"
+    )
+
+  return rename
+
+
+def normalize_df(
+  df: pl.DataFrame, replace_na: bool = False, list_na_cols: list[str] | None = None
+) -> pl.DataFrame:
+  """Normalise string columns of `df` returned by `get_df()` in a single pass.
+
+  Used as a pl.DataFrame.pipe() parameter.
+
+  For every string column:
+  * leading and trailing whitespace is trimmed
+  * empty strings are replaced with nulls
+  * coded columns (`dict_coded_values`) are mapped case-insensitively to their canonical values
+  * not-applicable codes (`list_na_values`) are replaced with nulls in `list_na_cols`,
+    and in every column if `replace_na` is True
+
+  Parameters
+  ----------
+  df
+      DataFrame returned by `get_df()`.
+  replace_na
+      Replace not-applicable codes with nulls, see `validate.lesion.REPLACE_NA`.
+  list_na_cols
+      Columns where not-applicable codes are always replaced with nulls, e.g. lesion
+      columns, where they have no meaning of their own.
+  """
+  list_na_cols = list_na_cols or []
+
+  def _get_col_expr(col: str) -> pl.Expr:
+    expr = pl.col(col).str.strip_chars().replace("", None)
+
+    if col in dict_coded_values:
+      canonical_values = dict_coded_values[col]
+      expr = expr.str.to_lowercase().replace(
+        [i.lower() for i in canonical_values], canonical_values, default=expr
+      )
+
+    if replace_na or col in list_na_cols:
+      expr = expr.replace(list_na_values, [None] * len(list_na_values))
+
+    return expr.alias(col)
+
+  return df.with_columns(
+    [_get_col_expr(col) for col, dtype in df.schema.items() if dtype == pl.Utf8]
+  )
+
+
+def encode_ic(df: pl.DataFrame) -> pl.DataFrame:
+  """Add column `ic_key` - `ICNUMBER` encoded as Int64.
+
+  Used as a pl.DataFrame.pipe() parameter, after `normalize_df()`.
+
+  * `ICNUMBER` with 12 digits: the number itself, `ic_key` >= 0
+  * other `ICNUMBER`: negative key from hash of the string, `ic_key` < 0
+  * null `ICNUMBER`: null
+  """
+  return df.with_columns(
+    pl.when(pl.col("ICNUMBER").is_null())
+    .then(None)
+    .when(pl.col("ICNUMBER").str.contains(r"^\d{12}$"))
+    .then(pl.col("ICNUMBER").cast(pl.Int64, strict=False))
+    .otherwise(-(pl.col("ICNUMBER").hash(seed=0) // 2).cast(pl.Int64) - 1)
+    .alias("ic_key")
+  )
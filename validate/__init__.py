@@ -1,3 +1,7 @@
 from dotenv import load_dotenv
 
-load_dotenv()
\ No newline at end of file
+load_dotenv()
+
+from .api import validate_frame
+
+__all__ = ["validate_frame"]
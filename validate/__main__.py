@@ -1,18 +1,33 @@
+import argparse
 import os
+import time
 from pathlib import Path
 
 import polars as pl
 
 import utils
+from constants import list_key_cols, list_required_cols
+from validate.diff import diff_runs, get_run_id, persist_run
 from validate.general import ValidationGeneral
-from validate.lesion import ValidationLesion
+from validate.lesion import ValidationLesion, REPLACE_NA
+from validate.lesion_colmap import list_lesion_cols
+from validate.profiling import compile_profile, get_profile, write_profile
+from validate.progress import Progress
+from validate.reference import get_dict_reference
+from validate.scheduler import compact_stats
+from validate.rollup import compile_rollup, get_screened_cube, write_rollup
+from validate.sample import run_sample
+from validate.workqueue import Lease, clear_queue, is_done, worker_id
 
-from .logger import logger
+from .logger import logger, setup_logger
 
 PATH_INPUT = os.getenv("PATH_INPUT")
 PATH_STORE = os.getenv("PATH_STORE")
 PATH_OUTPUT = os.getenv("PATH_OUTPUT")
 
+# estimated memory (MB) of all input files, below which files are validated as a batch
+BATCH_MAX_MB = int(os.getenv("BATCH_MAX_MB") or 1024)
+
 
 def _log_critical(msg: str, e: Exception):
   print(msg)
@@ -20,8 +35,15 @@ def _log_critical(msg: str, e: Exception):
   logger.exception(e)
 
 
-def _compile_output():
-  """Compiles parquet files in store into excel file in output."""
+def _compile_output(clean_up: bool = True):
+  """Compiles parquet files in store into excel file in output.
+
+  Parameters
+  ----------
+  clean_up
+      Remove compiled parquet files from store. Watch mode keeps the store so that
+      only changed files need to be validated again.
+  """
   list_store = ["general", "lesion"]
 
   for store_item in list_store:
@@ -32,47 +54,456 @@ def _compile_output():
       list_df.append(pl.scan_parquet(file_path))
 
     if len(list_df) == 0:
+      # remove stale output, e.g. all files removed from input in watch mode
+      output_file.unlink(missing_ok=True)
       continue
 
     df: pl.LazyFrame = pl.concat(list_df)
 
+    # sort by key, ICNUMBER is displayed instead of ic_key and row_id
     # unnest and stringify data to be written into excel
+    df = df.sort(["file", *list_key_cols]).drop("ic_key", "row_id")
     df.unnest("fail").with_columns(
       pl.col("data").list.join("; ")
     ).collect().write_excel(output_file, autofit=True)
 
     print(f"Output saved as {output_file}")
 
+    if not clean_up:
+      continue
+
     # clean up store
     for file_path in Path(PATH_STORE).glob(f"{store_item}/*.parquet"):
       os.unlink(file_path)
 
+  # rules exceeding caps of rows stored, see validate.store
+  list_path = list(Path(PATH_STORE).glob("systemic/*/*.parquet"))
+  output_file = Path(PATH_OUTPUT).joinpath("validation_systemic.xlsx")
 
-def main():
-  # clear output
-  for file_path in Path(PATH_OUTPUT).glob(f"*.xlsx"):
+  if len(list_path) == 0:
+    output_file.unlink(missing_ok=True)
+    return
+
+  pl.concat([pl.read_parquet(i) for i in list_path]).sort(
+    "file", "store", "rule_number"
+  ).write_excel(output_file, autofit=True)
+
+  print(f"Output saved as {output_file}")
+
+  if not clean_up:
+    return
+
+  for file_path in list_path:
     os.unlink(file_path)
 
-  # loop through all *.accdb files and invoke validation classes
-  for path in Path(PATH_INPUT).glob("*.accdb"):
-    print(f"Validating '{path.stem}'")
+
+def _clear_store(file_name: str):
+  """Removes store output of a single file, including its partial rollup cubes,
+  systemic failure counts and partial profiles."""
+  for file_path in Path(PATH_STORE).glob(f"*/{file_name}.parquet"):
+    os.unlink(file_path)
+  for file_path in Path(PATH_STORE).glob(f"rollup/*/{file_name}.parquet"):
+    os.unlink(file_path)
+  for file_path in Path(PATH_STORE).glob(f"systemic/*/{file_name}.parquet"):
+    os.unlink(file_path)
+  for file_path in Path(PATH_STORE).glob(f"profile/*/{file_name}.parquet"):
+    os.unlink(file_path)
+
+
+def _log_rejected(e: utils.PreflightError):
+  print(e)
+  logger.error(e)
+
+
+def _ingest(path: Path) -> pl.LazyFrame:
+  """Reads a single *.accdb file, tagged with its stem in the `file` column.
+
+  Raises PreflightError if the file is rejected by `utils.preflight()`.
+  """
+  rename = utils.preflight(path, [*list_required_cols, *list_lesion_cols])
+  if len(rename) > 0:
+    logger.warning(f"'{path.stem}' columns mapped by preflight: {rename}")
+
+  return (
+    utils.get_df(path, rename=rename)
+    .pipe(utils.normalize_df, replace_na=REPLACE_NA, list_na_cols=list_lesion_cols)
+    .pipe(utils.encode_ic)
+    .with_row_count("row_id")
+    .with_columns(pl.lit(path.stem).alias("file"))
+    .lazy()
+  )
+
+
+def _estimate_mb(list_path: list[Path]) -> float:
+  """Estimates memory (MB) of ingested files.
+
+  Size of cache is used if the file is cached, otherwise size of the source file.
+  """
+  size = 0
+  for path in list_path:
+    if utils.PATH_CACHE is not None and utils.get_cache_path(path).exists():
+      size += utils.get_cache_path(path).stat().st_size
+    else:
+      size += path.stat().st_size
+  return size / 2**20
+
+
+def _validate_batch(list_path: list[Path], progress: Progress, profile: bool = False):
+  """Invokes validation classes once on all *.accdb files concatenated as one frame.
+
+  Results are flushed into store as a parquet file for each file. Falls back to
+  `_validate_file()` for each file if the batch fails. If `profile` is True, the
+  batch is profiled (`validate.profiling`).
+  """
+  print(f"Validating {len(list_path)} files as a batch")
+  list_lf = []
+  list_rows = []
+  for path in list_path:
     try:
-      lf = utils.get_df(path).lazy()
+      with progress.stage("read", path.stem):
+        lf = _ingest(path)
+        list_rows.append(lf.select(pl.count()).collect().item())
+        list_lf.append(lf)
+    except utils.PreflightError as e:
+      _log_rejected(e)
     except Exception as e:
       _log_critical(f"Unhandled exception in utils.get_df(), path: {path}", e)
 
-    try:
-      ValidationGeneral(lf, path.stem).run_all()
-    except Exception as e:
-      _log_critical(f"Unhandled exception in ValidationGeneral object: {path.stem}", e)
+  if len(list_lf) == 0:
+    progress.done(list_path)
+    return
+
+  lf = pl.concat(list_lf, how="diagonal_relaxed")
+
+  try:
+    write_rollup(get_screened_cube(lf), "screened", "batch")
+    if profile:
+      with progress.stage("profile", "batch"):
+        write_profile(get_profile(lf))
+    with progress.stage("general", "batch"):
+      df_count_general = ValidationGeneral(lf, "batch", get_dict_reference()).run_all()
+    with progress.stage("lesion", "batch"):
+      df_count_lesion = ValidationLesion(lf, "batch").run_all()
+  except Exception as e:
+    _log_critical("Unhandled exception in batch, validating file by file", e)
+    for path in list_path:
+      _clear_store(path.stem)
+    _clear_store("batch")
+    for path in list_path:
+      _validate_file(path, progress, profile)
+    return
+
+  progress.add_rows(sum(list_rows))
+  progress.add_failed("general", df_count_general)
+  progress.add_failed("lesion", df_count_lesion)
+  progress.done(list_path)
+
 
+def _is_lease_lost(path: Path, lease: Lease | None) -> bool:
+  """If `lease` of `path` was taken over by another worker, which then writes its
+  store output."""
+  if lease is None or lease.is_owner():
+    return False
+
+  logger.warning(f"Lease of '{path.stem}' taken over by another worker, stopped")
+  return True
+
+
+def _validate_file(
+  path: Path, progress: Progress, profile: bool = False, lease: Lease | None = None
+):
+  """Invokes validation classes on a single *.accdb file, flushing results into store.
+
+  If `profile` is True, the file is profiled (`validate.profiling`). If `lease` is
+  given, results are flushed only while it is held by this worker.
+  """
+  try:
+    with progress.stage("read", path.stem):
+      lf = _ingest(path)
+      rows = lf.select(pl.count()).collect().item()
+  except utils.PreflightError as e:
+    _log_rejected(e)
+    progress.done([path])
+    return
+  except Exception as e:
+    _log_critical(f"Unhandled exception in utils.get_df(), path: {path}", e)
+    progress.done([path])
+    return
+
+  if _is_lease_lost(path, lease):
+    progress.done([path])
+    return
+
+  try:
+    write_rollup(get_screened_cube(lf), "screened", path.stem)
+  except Exception as e:
+    _log_critical(f"Unhandled exception in rollup: {path.stem}", e)
+
+  if profile:
     try:
-      ValidationLesion(lf, path.stem).run_all()
+      with progress.stage("profile", path.stem):
+        write_profile(get_profile(lf))
     except Exception as e:
-      _log_critical(f"Unhandled exception in ValidationLesion object: {path.stem}", e)
+      _log_critical(f"Unhandled exception in profiling: {path.stem}", e)
+
+  if _is_lease_lost(path, lease):
+    progress.done([path])
+    return
+
+  try:
+    with progress.stage("general", path.stem):
+      progress.add_failed(
+        "general", ValidationGeneral(lf, path.stem, get_dict_reference()).run_all()
+      )
+  except Exception as e:
+    _log_critical(f"Unhandled exception in ValidationGeneral object: {path.stem}", e)
+
+  if _is_lease_lost(path, lease):
+    progress.done([path])
+    return
 
-  _compile_output()
+  try:
+    with progress.stage("lesion", path.stem):
+      progress.add_failed("lesion", ValidationLesion(lf, path.stem).run_all())
+  except Exception as e:
+    _log_critical(f"Unhandled exception in ValidationLesion object: {path.stem}", e)
+
+  progress.add_rows(rows)
+  progress.done([path])
+
+
+def main(mode: str = "auto", profile: bool = False):
+  """Validates all *.accdb files in input, compiles output.
+
+  Parameters
+  ----------
+  mode
+      `file` to validate file by file, `batch` to validate all files as one frame,
+      `auto` for batch if estimated memory of all files is below `BATCH_MAX_MB`.
+  profile
+      Profile columns of all files into `profile.xlsx`, see `validate.profiling`.
+  """
+  # clear output
+  for file_path in Path(PATH_OUTPUT).glob("*.xlsx"):
+    os.unlink(file_path)
+
+  list_path = list(Path(PATH_INPUT).glob("*.accdb"))
+  progress = Progress(list_path)
+
+  if mode == "auto":
+    mode = "batch" if _estimate_mb(list_path) <= BATCH_MAX_MB else "file"
+
+  if mode == "batch":
+    _validate_batch(list_path, progress, profile)
+  else:
+    # loop through all *.accdb files and invoke validation classes
+    for path in list_path:
+      _validate_file(path, progress, profile)
+
+  _merge_output(progress)
+
+
+def _merge_output(progress: Progress):
+  """Persists and diffs the run, compiles store into output."""
+  try:
+    with progress.stage("store"):
+      run_id = get_run_id()
+      persist_run(run_id)
+      diff_runs(run_id)
+      compact_stats()
+  except Exception as e:
+    _log_critical("Unhandled exception in comparing against previous run", e)
+
+  with progress.stage("export"):
+    _compile_output()
+    compile_rollup()
+    compile_profile()
+
+
+def worker(interval: float, profile: bool = False):
+  """Claims and validates *.accdb files in input, one at a time, until all files are
+  done. Several workers, on one or more hosts, can share input and store.
+
+  Files are claimed with leases (`validate.workqueue`). Store output of a file is
+  written by the worker holding its lease. Files leased by other workers are polled
+  every `interval` seconds, until done or their lease turns stale and is taken over.
+  Results are compiled by `merge()` once all workers are done.
+
+  Parameters
+  ----------
+  interval
+      Seconds between polls for files leased by other workers.
+  profile
+      Profile columns of files validated, see `validate.profiling`.
+  """
+  print(f"Worker {worker_id} started")
+  list_path = list(Path(PATH_INPUT).glob("*.accdb"))
+  progress = Progress(list_path)
+
+  while True:
+    list_pending = [path for path in list_path if not is_done(path)]
+    if len(list_pending) == 0:
+      break
+
+    for path in list_pending:
+      lease = Lease(path)
+      if not lease.acquire():
+        continue
+
+      with lease:
+        if is_done(path):  # done by another worker since listed
+          continue
+
+        # a taken over file can have partial output of a dead worker
+        _clear_store(path.stem)
+        _validate_file(path, progress, profile, lease)
+        # a file taken over is done by its new owner
+        if lease.is_owner():
+          lease.mark_done()
+
+    if any(not is_done(path) for path in list_pending):
+      time.sleep(interval)
+
+  print(f"Worker {worker_id} done, {len(progress.list_done)} files validated")
+
+
+def merge():
+  """Compiles store output of all workers into output, once all files are done."""
+  for file_path in Path(PATH_OUTPUT).glob("*.xlsx"):
+    os.unlink(file_path)
+
+  list_path = list(Path(PATH_INPUT).glob("*.accdb"))
+  list_pending = [path.stem for path in list_path if not is_done(path)]
+  if len(list_pending) > 0:
+    print(f"Not merged, files not validated yet: {list_pending}")
+    return
+
+  _merge_output(Progress(list_path))
+  clear_queue()
+
+
+def watch(interval: float, profile: bool = False):
+  """Polls input folder and validates new or changed *.accdb files as they arrive.
+
+  A file is validated once its mtime and size are unchanged across two polls, so
+  that files still being copied into input are not read. Store is kept between
+  polls, output is recompiled after every poll with changes.
+
+  Parameters
+  ----------
+  interval
+      Seconds between polls.
+  profile
+      Profile columns of files validated, see `validate.profiling`.
+  """
+  dict_seen: dict[Path, tuple[int, int]] = {}
+  dict_validated: dict[Path, tuple[int, int]] = {}
+
+  print(f"Watching '{PATH_INPUT}' every {interval}s, press Ctrl+C to stop")
+  while True:
+    dict_current = {}
+    for path in Path(PATH_INPUT).glob("*.accdb"):
+      try:
+        stat = path.stat()
+      except FileNotFoundError:
+        # removed or renamed since glob(), picked up by its new name in next poll
+        continue
+      dict_current[path] = (stat.st_mtime_ns, stat.st_size)
+
+    list_removed = [i for i in dict_validated if i not in dict_current]
+    list_changed = [
+      path
+      for path, stat in dict_current.items()
+      if dict_seen.get(path) == stat and dict_validated.get(path) != stat
+    ]
+
+    for path in list_removed:
+      _clear_store(path.stem)
+      del dict_validated[path]
+
+    progress = Progress(list_changed)
+    for path in list_changed:
+      _clear_store(path.stem)
+      _validate_file(path, progress, profile)
+      dict_validated[path] = dict_current[path]
+
+    if len(list_removed) > 0 or len(list_changed) > 0:
+      try:
+        _compile_output(clean_up=False)
+        compile_rollup(clean_up=False)
+        compile_profile(clean_up=False)
+      except Exception as e:
+        # output can be locked, e.g. excel file opened by user
+        _log_critical("Unhandled exception in compiling output", e)
+
+    dict_seen = dict_current
+    time.sleep(interval)
 
 
 if __name__ == "__main__":
-  main()
+  parser = argparse.ArgumentParser(prog="python -m validate")
+  parser.add_argument(
+    "--watch",
+    action="store_true",
+    help="keep running and validate files as they arrive",
+  )
+  parser.add_argument(
+    "--interval",
+    type=float,
+    default=10,
+    help="seconds between polls in watch and worker mode",
+  )
+  parser.add_argument(
+    "--sample",
+    type=float,
+    metavar="FRACTION",
+    help="validate a sample of rows of each file and estimate failure rates",
+  )
+  parser.add_argument(
+    "--stratify", action="store_true", help="sample within each DISTRICT"
+  )
+  parser.add_argument("--seed", type=int, help="random seed for sampling")
+  parser.add_argument(
+    "--worker",
+    action="store_true",
+    help="claim and validate files shared with other workers, see --merge",
+  )
+  parser.add_argument(
+    "--merge",
+    action="store_true",
+    help="compile output of all workers once all files are validated",
+  )
+  parser.add_argument(
+    "--profile",
+    action="store_true",
+    help="profile null rates, coded values and DATESCREEN ranges into profile.xlsx",
+  )
+  parser.add_argument(
+    "--mode",
+    choices=["auto", "batch", "file"],
+    default="auto",
+    help="validate all files as one batch or file by file, auto by estimated memory",
+  )
+  args = parser.parse_args()
+
+  setup_logger()
+  logger.info(
+    f"ValidationGeneral run_all(): {len(ValidationGeneral.list_all_func)} rules"
+  )
+  logger.info(
+    f"ValidationLesion run_all(): {len(ValidationLesion.list_all_func)} rules"
+  )
+
+  if args.sample is not None:
+    run_sample(args.sample, args.stratify, args.seed)
+  elif args.worker:
+    worker(args.interval, args.profile)
+  elif args.merge:
+    merge()
+  elif args.watch:
+    try:
+      watch(args.interval, args.profile)
+    except KeyboardInterrupt:
+      pass
+  else:
+    main(args.mode, args.profile)
@@ -0,0 +1,71 @@
+import polars as pl
+
+import utils
+from constants import RuleEnum
+
+from .general import ValidationGeneral
+from .lesion import ValidationLesion, REPLACE_NA
+from .lesion_colmap import list_lesion_cols
+from .reference import prepare_reference
+
+
+def _validate_frame(
+  df: pl.DataFrame, dict_reference: dict[str, pl.DataFrame] | None = None
+) -> tuple[pl.DataFrame, list[RuleEnum]]:
+  """`validate_frame()`, also returns rules run, i.e. not skipped."""
+  if "file" not in df.columns:
+    df = df.with_columns(pl.lit(None, pl.Utf8).alias("file"))
+
+  lf = (
+    df.pipe(utils.normalize_df, replace_na=REPLACE_NA, list_na_cols=list_lesion_cols)
+    .pipe(utils.encode_ic)
+    .with_row_count("row_id")
+    .lazy()
+  )
+
+  validation_general = ValidationGeneral(
+    lf,
+    "",
+    {
+      name: prepare_reference(name, df_reference)
+      for name, df_reference in (dict_reference or {}).items()
+    },
+  )
+  validation_lesion = ValidationLesion(lf, "")
+
+  df_failed = pl.concat(
+    [validation_general.collect_all(), validation_lesion.collect_all()],
+    how="diagonal",
+  ).select(list(ValidationLesion.validation_df_schema.keys()))
+
+  return df_failed, [
+    *validation_general.list_rule_run,
+    *validation_lesion.list_rule_run,
+  ]
+
+
+def validate_frame(
+  df: pl.DataFrame, dict_reference: dict[str, pl.DataFrame] | None = None
+) -> pl.DataFrame:
+  """Validates `df` in memory, without store, output or log files.
+
+  Runs all rules of `ValidationGeneral` and `ValidationLesion`.
+
+  Parameters
+  ----------
+  df
+      Frame in the format returned by `utils.get_df()`. A `file` column is added
+      (null) if missing.
+  dict_reference
+      Master code lists by name, with columns of `validate.reference.dict_reference_cols`,
+      e.g. `{"district": df_district}`. Rules checking against a master code list are
+      skipped if it is not given, `PATH_REFERENCE` is not read.
+
+  Returns
+  -------
+  pl.DataFrame
+      Failed datapoints with identifier columns, `ic_key`, `row_id` (row index in `df`),
+      `lesion_id` (null for general rules) and `fail` struct, in the format of
+      `ValidationLesion.validation_df_schema`.
+  """
+  return _validate_frame(df, dict_reference)[0]
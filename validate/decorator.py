@@ -1,6 +1,80 @@
 from functools import wraps
 import polars as pl
 
+# Scopes: subsets of rows that a validation function applies to
+dict_scope_expr = {
+  "valid_ic": pl.col("valid_ic") == True,
+  "lesion": pl.col("LESION") == True,
+  "referral_quit": pl.col("REFERRAL TO QUIT SERVICES") == True,
+}
+
+
+def scope(scope_name: str):
+  """Decorator for validation functions to limit the validation function to only apply
+  to subset of rows in scope `scope_name` (`dict_scope_expr`).
+
+  This should be the outermost decorator. When invoked through `ScopeCache.run()`, the
+  function receives rows pre-filtered once per file, shared with other functions of
+  the same scope.
+
+  Parameters
+  ----------
+  scope_name
+      Key of `dict_scope_expr`.
+  """
+
+  def decorator(func):
+    @wraps(func)
+    def wrapper(lf: pl.LazyFrame, *args, scoped: bool = False):
+      if not scoped:
+        lf = lf.filter(dict_scope_expr[scope_name])
+      return func(lf, *args)
+
+    wrapper.scope = scope_name
+    return wrapper
+
+  return decorator
+
+
+def gate(nonnull: list[str]):
+  """Decorator for validation functions that cannot fail on rows where any column of
+  `nonnull` is null, e.g. comparisons that evaluate to null.
+
+  `ScopeCache` skips the function if any column of `nonnull` is entirely null in its
+  scope. This should be placed below scope decorators.
+
+  Parameters
+  ----------
+  nonnull
+      Column names, each required to be non-null for a row to fail.
+  """
+
+  def decorator(func):
+    func.nonnull = nonnull
+    return func
+
+  return decorator
+
+
+def reference(name: str):
+  """Decorator for validation functions checking against master code list `name`
+  (`validate.reference`).
+
+  The function is invoked with the reference frame as second argument, and is
+  skipped if the reference is not given to the Validation class.
+
+  Parameters
+  ----------
+  name
+      Key of `dict_reference_cols`.
+  """
+
+  def decorator(func):
+    func.reference = name
+    return func
+
+  return decorator
+
 
 def valid_ic(func):
   """Wraps validation function to limit the validation function to only apply to
@@ -9,10 +83,55 @@ def valid_ic(func):
   The lf received must have been passed through `_pipe_validate_ic()` to generate
   the `valid_ic` column.
   """
+  return scope("valid_ic")(func)
+
+
+def lesion(func):
+  """Wraps validation function to limit the validation function to only apply to
+  subset of rows with `LESION` == True.
+  """
+  return scope("lesion")(func)
+
+
+def referral_quit(func):
+  """Wraps validation function to limit the validation function to only apply to
+  subset of rows with `REFERRAL TO QUIT SERVICES` == True.
+  """
+  return scope("referral_quit")(func)
+
+
+class ScopeCache:
+  """Collects `lf` once per file, and filters rows of each scope once on first use.
+
+  Used in `run_all()` of Validation classes to invoke validation functions.
+  """
+
+  def __init__(self, lf: pl.LazyFrame):
+    self.df = lf.collect()
+    self.dict_df: dict[str, pl.DataFrame] = {}
+
+  def get(self, scope_name: str) -> pl.DataFrame:
+    if scope_name not in self.dict_df:
+      self.dict_df[scope_name] = self.df.filter(dict_scope_expr[scope_name])
+    return self.dict_df[scope_name]
+
+  def can_skip(self, func) -> bool:
+    """If validation function `func` cannot fail on rows of its scope: the scope has no
+    rows, or a column of its `gate()` is entirely null. Null counts are kept by polars,
+    no column is scanned."""
+    scope_name = getattr(func, "scope", None)
+    df = self.df if scope_name is None else self.get(scope_name)
+
+    if df.is_empty():
+      return True
 
-  @wraps(func)
-  def wrapper(lf: pl.LazyFrame):
-    lf = lf.filter(pl.col("valid_ic") == True)
-    return func(lf)
+    return any(
+      df[col].null_count() == df.height for col in getattr(func, "nonnull", [])
+    )
 
-  return wrapper
+  def run(self, func, *args) -> pl.LazyFrame:
+    """Invokes validation function `func` on rows of its scope, with `args`."""
+    scope_name = getattr(func, "scope", None)
+    if scope_name is None:
+      return func(self.df.lazy(), *args)
+    return func(self.get(scope_name).lazy(), *args, scoped=True)
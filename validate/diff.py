@@ -0,0 +1,135 @@
+import os
+import shutil
+from datetime import datetime
+from pathlib import Path
+
+import polars as pl
+import xlsxwriter
+
+PATH_STORE = os.getenv("PATH_STORE")
+PATH_OUTPUT = os.getenv("PATH_OUTPUT")
+
+list_store = ["general", "lesion"]
+runs_to_keep = 10
+
+
+def get_run_id() -> str:
+  """Id of a run, by its start time to the microsecond, sorted as the runs."""
+  return datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+
+
+def _key_hash_expr(cols: list[str]) -> pl.Expr:
+  """Hashes record key columns into a single u64 column.
+
+  Note: polars hash is stable for the same polars version only, runs persisted by a
+  different polars version must not be compared.
+  """
+  return pl.struct(cols).hash(seed=0).alias("key_hash")
+
+
+def persist_run(run_id: str):
+  """Persists validation results in store into `store/runs/<run_id>`.
+
+  Must be invoked before store is cleaned up by `_compile_output()`. The run is
+  persisted even without failures, so that it is diffed as all resolved. Raises
+  FileExistsError if run `run_id` is already persisted.
+  """
+  path_run = Path(PATH_STORE).joinpath(f"runs/{run_id}")
+  path_run.mkdir(parents=True)
+
+  for store_item in list_store:
+    list_path = list(Path(PATH_STORE).glob(f"{store_item}/*.parquet"))
+    if len(list_path) == 0:
+      continue
+
+    lf = pl.concat([pl.scan_parquet(i) for i in list_path])
+    # ICNUMBER is for display only, encoded as ic_key, row_id shifts as rows are added
+    key_cols = [col for col in lf.columns if col not in ["fail", "ICNUMBER", "row_id"]]
+
+    lf.with_columns(
+      _key_hash_expr(key_cols),
+      pl.col("fail").struct.field("rule_number"),
+    ).sink_parquet(path_run.joinpath(f"{store_item}.parquet"), compression="lz4")
+
+  # prune old runs
+  list_run = sorted(Path(PATH_STORE).glob("runs/*"))
+  for path in list_run[:-runs_to_keep]:
+    shutil.rmtree(path)
+
+
+def _diff_joins(lf_current: pl.LazyFrame, lf_previous: pl.LazyFrame):
+  """New, resolved and persisting failures, to be collected together."""
+  keys = ["key_hash", "rule_number"]
+  return [
+    lf_current.join(lf_previous.select(keys), on=keys, how="anti"),
+    lf_previous.join(lf_current.select(keys), on=keys, how="anti"),
+    lf_current.join(lf_previous.select(keys), on=keys, how="semi"),
+  ]
+
+
+def diff_runs(run_id: str):
+  """Compares run `run_id` against the previous persisted run.
+
+  Failures are joined on (record key hash, `rule_number`) into:
+  * new: fails in current run only
+  * resolved: fails in previous run only
+  * persisting: fails in both runs
+
+  Output: `validation_diff_<store>.xlsx` with a summary sheet of counts by district and
+  rule, and a sheet for each set.
+  """
+  list_run = sorted(i.name for i in Path(PATH_STORE).glob("runs/*"))
+  if run_id not in list_run or list_run.index(run_id) == 0:
+    return
+
+  path_current = Path(PATH_STORE).joinpath(f"runs/{run_id}")
+  path_previous = Path(PATH_STORE).joinpath(
+    f"runs/{list_run[list_run.index(run_id) - 1]}"
+  )
+
+  for store_item in list_store:
+    file_current = path_current.joinpath(f"{store_item}.parquet")
+    file_previous = path_previous.joinpath(f"{store_item}.parquet")
+    if not file_current.exists() and not file_previous.exists():
+      continue
+
+    # a store can be missing in one run if it had no failures
+    file_schema = file_current if file_current.exists() else file_previous
+    lf_current, lf_previous = [
+      pl.scan_parquet(i) if i.exists() else pl.scan_parquet(file_schema).clear()
+      for i in [file_current, file_previous]
+    ]
+
+    dict_diff = dict(
+      zip(
+        ["new", "resolved", "persisting"],
+        pl.collect_all(_diff_joins(lf_current, lf_previous)),
+      )
+    )
+
+    df_summary = (
+      pl.concat(
+        [
+          df.group_by("DISTRICT", "rule_number").agg(
+            pl.col("fail").struct.field("rule").first(),
+            pl.count().cast(pl.Int64).alias(name),
+          )
+          for name, df in dict_diff.items()
+        ],
+        how="diagonal",
+      )
+      .group_by("DISTRICT", "rule_number")
+      .agg(pl.col("rule").first(), pl.col("new", "resolved", "persisting").sum())
+      .sort("DISTRICT", "rule_number")
+    )
+
+    output_file = Path(PATH_OUTPUT).joinpath(f"validation_diff_{store_item}.xlsx")
+    with xlsxwriter.Workbook(output_file) as wb:
+      df_summary.write_excel(wb, worksheet="summary", autofit=True)
+      for name, df in dict_diff.items():
+        # unnest and stringify data to be written into excel
+        df.drop("key_hash", "rule_number", "ic_key").unnest("fail").with_columns(
+          pl.col("data").list.join("; ")
+        ).write_excel(wb, worksheet=name, autofit=True)
+
+    print(f"Output saved as {output_file}")
@@ -1,4 +1,5 @@
 import math
+import time
 from datetime import date
 
 import polars as pl
@@ -6,8 +7,9 @@ import polars as pl
 from constants import RuleEnum
 
 from .store import store_data, ValidationStore
-from .decorator import valid_ic
-from .logger import logger
+from .decorator import ScopeCache, gate, lesion, reference, referral_quit, valid_ic
+from .reference import code_expr
+from .scheduler import RuleScheduler
 
 # constants
 today = date.today()
@@ -33,6 +35,7 @@ additionaldetails_blacklist = ["true|false|true", "true|true|false"]
 
 
 # inclusion criteria
+@gate(["LESION", "HABITS"])
 @store_data(RuleEnum.INCLUSION_LESION_OR_HABIT, ["LESION", "HABITS"])
 def _validate_inclusion_lesion_or_habit(lf: pl.LazyFrame):
   """
@@ -50,7 +53,8 @@ def _pipe_validate_ic(lf: pl.LazyFrame):
   # year_p2 is second two digits of birth year
   return (
     lf.with_columns(  # slice first two digits as year_p2
-      pl.when(pl.col("ICNUMBER").str.contains(r"^\d{12}$"))
+      # `ic_key` is non-negative for `ICNUMBER` with 12 digits, see utils.encode_ic()
+      pl.when(pl.col("ic_key") >= 0)
       .then(True)
       .otherwise(False)
       .alias("valid_ic_digits"),
@@ -102,6 +106,7 @@ def _validate_ic(lf: pl.LazyFrame):
 
 # date validation
 @valid_ic
+@gate(["DATEBIRTH"])
 @store_data(
   RuleEnum.IC_VS_DATEBIRTH,
   ["DATEBIRTH", "datebirth_from_ic"],
@@ -124,6 +129,7 @@ def _validate_date_r4(lf: pl.LazyFrame):
   )
 
 
+@gate(["DATE REFERRED", "DATE SEEN BY SPECIALIST"])
 @store_data(
   RuleEnum.DATEREFER_VS_DATE_SEEN_SPECIALIST,
   ["DATE REFERRED", "DATE SEEN BY SPECIALIST"],
@@ -179,6 +185,7 @@ def _validate_date_r6(lf: pl.LazyFrame):
 
 
 @valid_ic
+@gate(["GENDER CODE"])
 @store_data(RuleEnum.IC_VS_GENDER, ["ICNUMBER", "GENDER CODE"])
 def _validate_r1(lf: pl.LazyFrame):
   """
@@ -186,10 +193,11 @@ def _validate_r1(lf: pl.LazyFrame):
   """
   return lf.with_columns(
     (pl.col("GENDER CODE").cast(pl.Int16) % 2).alias("R1_GENDER_mod"),
-    (pl.col("ICNUMBER").str.slice(-1).cast(pl.Int16) % 2).alias("R1_IC_mod"),
+    (pl.col("ic_key") % 2).cast(pl.Int16).alias("R1_IC_mod"),
   ).filter(pl.col("R1_GENDER_mod") != pl.col("R1_IC_mod"))
 
 
+@gate(["LESION", "REFERAL TO SPECIALIST"])
 @store_data(RuleEnum.LESION_VS_REFER_SPECIALIST, ["LESION", "REFERAL TO SPECIALIST"])
 def _validate_r2(lf: pl.LazyFrame):
   """
@@ -198,14 +206,15 @@ def _validate_r2(lf: pl.LazyFrame):
   return lf.filter(pl.col("LESION") != pl.col("REFERAL TO SPECIALIST"))
 
 
+@lesion
 @store_data(RuleEnum.LESION_VS_TELEPHONE, ["LESION", "TELEPHONE NO"])
 def _validate_lesion_telephone(lf: pl.LazyFrame):
   """
   Rule: `LESION` if True, `TELEPHONE NO` should be filled and matches regex pattern `^(6?0[1-9])\\d{7,9}$`
   """
-  return lf.with_columns("LESION", "TELEPHONE NO").filter(
-    (pl.col("LESION") == True)
-    & ~(pl.col("TELEPHONE NO").str.contains(r"^(6?0[1-9])\d{7,9}$"))
+  # null `TELEPHONE NO` (including empty strings nulled by `utils.normalize_df()`) is not filled
+  return lf.filter(
+    ~pl.col("TELEPHONE NO").str.contains(r"^(6?0[1-9])\d{7,9}$").fill_null(False)
   )
 
 
@@ -316,6 +325,7 @@ def _validate_alcohol(lf: pl.LazyFrame):
   )
 
 
+@referral_quit
 @store_data(
   RuleEnum.REFERRAL_QUIT_VS_READY_QUIT, ["TOBACCO QUIT", "REFERRAL TO QUIT SERVICES"]
 )
@@ -325,11 +335,10 @@ def _validate_referral_quit_vs_ready_quit(lf: pl.LazyFrame):
     .then(True)
     .otherwise(False)
     .alias("tobacco_quit")
-  ).filter(
-    (pl.col("REFERRAL TO QUIT SERVICES") == True) & (pl.col("tobacco_quit") == False)
-  )
+  ).filter(pl.col("tobacco_quit") == False)
 
 
+@gate(["REFERRAL TO QUIT SERVICES"])
 @store_data(
   RuleEnum.REFERRAL_QUIT_VS_DATE_REFERRED_VS_FIRST_APPT_DATE,
   ["REFERRAL TO QUIT SERVICES", "has_referred_date", "has_appt_date"],
@@ -354,6 +363,7 @@ def _validate_referral_quit_vs_date_referral_quit(lf: pl.LazyFrame):
   )
 
 
+@gate(["TARIKH TEMUJANJI QUIT SERVICE"])
 @store_data(
   RuleEnum.ATTEND_FIRST_APPT_NULL_CHECK,
   ["TARIKH TEMUJANJI QUIT SERVICE", "HADIR QUIT SERVICES"],
@@ -423,6 +433,7 @@ def _validate_famihistcancer(lf: pl.LazyFrame):
   )
 
 
+@lesion
 @store_data(
   RuleEnum.LESION_VS_ADDITIONAL_DETAILS,
   ["LESION", "occupation_filled", "education_filled"],
@@ -451,6 +462,73 @@ def _validate_additionaldetails(lf: pl.LazyFrame):
   )
 
 
+# reference data
+@reference("district")
+@store_data(RuleEnum.DISTRICT_VS_REFERENCE, ["DISTRICT"])
+def _validate_district_reference(lf: pl.LazyFrame, df_reference: pl.DataFrame):
+  """
+  Rule: `DISTRICT` should be in the district master code list.
+  """
+  return lf.with_columns(code_expr("DISTRICT").alias("district_code")).join(
+    df_reference.lazy().select(pl.col("DISTRICT").alias("district_code")),
+    on="district_code",
+    how="anti",
+  )
+
+
+@reference("location")
+@store_data(RuleEnum.LOCATION_VS_REFERENCE, ["DISTRICT", "LOCATION OF SCREENING"])
+def _validate_location_reference(lf: pl.LazyFrame, df_reference: pl.DataFrame):
+  """
+  Rule: `LOCATION OF SCREENING` should be in the location master code list, under its
+  `DISTRICT`.
+  """
+  return lf.with_columns(
+    code_expr("DISTRICT").alias("district_code"),
+    code_expr("LOCATION OF SCREENING").alias("location_code"),
+  ).join(
+    df_reference.lazy().select(
+      pl.col("DISTRICT").alias("district_code"),
+      pl.col("LOCATION OF SCREENING").alias("location_code"),
+    ),
+    on=["district_code", "location_code"],
+    how="anti",
+  )
+
+
+@reference("district")
+@store_data(
+  RuleEnum.FILE_STATE_DISTRICT_COMBINATION, ["state_district", "combination_rows"]
+)
+def _validate_file_state_district(lf: pl.LazyFrame, df_reference: pl.DataFrame):
+  """
+  Rule: A file should have a single `STATE` | `DISTRICT` combination. Files with more
+  than one combination are flagged once for each combination, with its row count and
+  the first row of the combination. `STATE` is looked up from the district master
+  code list.
+  """
+  return (
+    lf.with_columns(code_expr("DISTRICT").alias("district_code"))
+    .join(
+      df_reference.lazy()
+      .unique(subset="DISTRICT", keep="first", maintain_order=True)
+      .select(pl.col("STATE"), pl.col("DISTRICT").alias("district_code")),
+      on="district_code",
+      how="left",
+    )
+    .with_columns(
+      pl.concat_str(
+        pl.col("STATE").fill_null("Null"),
+        pl.col("district_code").fill_null("Null"),
+        separator="|",
+      ).alias("state_district")
+    )
+    .group_by("file", "state_district", maintain_order=True)
+    .agg(pl.all().first(), pl.count().alias("combination_rows"))
+    .filter(pl.count().over("file") > 1)
+  )
+
+
 class ValidationGeneral:
   """Validation object
 
@@ -478,29 +556,85 @@ class ValidationGeneral:
     _validate_medihist,
     _validate_famihistcancer,
     _validate_additionaldetails,
+    _validate_district_reference,
+    _validate_location_reference,
+    _validate_file_state_district,
   ]
 
   validation_df_store = "general"
 
   validation_df_schema = {
+    "file": pl.Utf8,
     "DISTRICT": pl.Utf8,
     "LOCATION OF SCREENING": pl.Utf8,
     "DATESCREEN": pl.Date,
     "ICNUMBER": pl.Utf8,
+    "ic_key": pl.Int64,
+    "row_id": pl.UInt32,
     "fail": pl.Struct(
       {"rule_number": pl.Int32, "rule": pl.Utf8, "data": pl.List(pl.Utf8)}
     ),
   }
 
-  def __init__(self, lf: pl.LazyFrame, file_name: str) -> None:
+  def __init__(
+    self,
+    lf: pl.LazyFrame,
+    file_name: str,
+    dict_reference: dict[str, pl.DataFrame] | None = None,
+  ) -> None:
     self.lf = lf.pipe(_pipe_validate_ic)
     self.file_name = file_name
-
-  def run_all(self):
+    # master code lists by name, see `validate.reference.prepare_reference()`
+    self.dict_reference = dict_reference or {}
+    # rules of functions invoked by `iter_lf()`
+    self.list_rule_run: list[RuleEnum] = []
+
+  def iter_lf(self, scope_cache: ScopeCache, list_func: list | None = None):
+    """Yields each validation function of `list_func` (default `list_all_func`) with
+    its output, invoked on rows of its scope. Functions that cannot fail or without
+    their reference are skipped, see `ScopeCache.can_skip()`."""
+    for func in list_func or self.list_all_func:
+      if scope_cache.can_skip(func):
+        continue
+
+      name = getattr(func, "reference", None)
+      if name is None:
+        self.list_rule_run.append(func.rule_enum)
+        yield func, scope_cache.run(func)
+      elif name in self.dict_reference:
+        self.list_rule_run.append(func.rule_enum)
+        yield func, scope_cache.run(func, self.dict_reference[name])
+
+  def run_all(self) -> pl.DataFrame:
+    """Runs all validation functions into store, returns failed datapoints of each rule.
+
+    Functions are run in order of measured cost, see `validate.scheduler`."""
+    scope_cache = ScopeCache(self.lf)
+    scheduler = RuleScheduler(self.validation_df_store)
     with ValidationStore(
-      self.validation_df_store, self.validation_df_schema, self.file_name
+      self.validation_df_store,
+      self.validation_df_schema,
+      self.file_name,
+      [func.rule_enum for func in self.list_all_func],
     ) as store_handler:
-      for func in self.list_all_func:
-        store_handler.extend_df(func(self.lf))
+      for func, lf in self.iter_lf(scope_cache, scheduler.order(self.list_all_func)):
+        time_start = time.perf_counter()
+        failed = store_handler.extend_df(lf)
+        scheduler.add(
+          func, scope_cache.df.height, time.perf_counter() - time_start, failed
+        )
 
-logger.info(f"ValidationGeneral run_all(): {len(ValidationGeneral.list_all_func)} rules")
+    scheduler.save()
+    return store_handler.get_count()
+
+  def collect_all(self) -> pl.DataFrame:
+    """Collects output of all validation functions, bypassing store."""
+    cols = list(self.validation_df_schema.keys())
+    return pl.concat(
+      [
+        pl.DataFrame(schema=self.validation_df_schema),
+        *pl.collect_all(
+          [lf.select(cols) for _, lf in self.iter_lf(ScopeCache(self.lf))]
+        ),
+      ]
+    )
@@ -1,9 +1,12 @@
+import time
+
 import polars as pl
 
-from constants import RuleEnum, list_id_cols
+from constants import RuleEnum, list_id_cols, list_key_cols
 
+from .decorator import ScopeCache, gate
 from .lesion_colmap import col_map, chunks
-from .logger import logger
+from .scheduler import RuleScheduler
 from .store import ValidationStore, store_data
 
 REPLACE_NA = False
@@ -42,35 +45,18 @@ def convert_into_lesion_lf(lf: pl.LazyFrame):
     ]
 
   return (
-    lf.select(pl.col(list_id_cols), *_get_lesion_expr())
+    lf.select(
+      pl.col("file"),
+      pl.col(list_id_cols),
+      pl.col("ic_key", "row_id"),
+      *_get_lesion_expr(),
+    )
     # explode and unnest
     .explode("lesion_list")
     .unnest("lesion_list")
   )
 
 
-def convert_NA_into_nulls(lf: pl.LazyFrame):
-  """Conditionally replace N/A data points with nulls.
-
-  Used as a pl.DataFrame.pipe() parameter.
-
-  Notes:
-
-  `0 - not applicable` in `type` and `size`
-
-  `00 = not applicable` in sites
-  """
-  if REPLACE_NA is False:
-    return lf
-  else:
-    return lf.with_columns(
-      pl.col(["type", "size"]).replace("0 - not applicable", None),
-      pl.col(["site_A", "site_B", "site_C", "site_D"]).replace(
-        "00 = not applicable", None
-      ),
-    )
-
-
 def compute_lesion_filled(lf: pl.LazyFrame):
   """
   Computer the `lesion_filled` column based on the 6 lesion descriptors.
@@ -91,6 +77,7 @@ def compute_lesion_filled(lf: pl.LazyFrame):
   )
 
 
+@gate(["LESION"])
 @store_data(
   RuleEnum.LESION_VS_LESION_COLS,
   [
@@ -109,7 +96,7 @@ def _validate_r7(lf: pl.LazyFrame):
   Rule: If `LESION` is False, `lesion_count` should be `0`; If `LESION` is True, `lesion_count` should be more than `0`.
   """
   return lf.with_columns(
-    pl.col("lesion_filled").sum().over(list_id_cols).alias("lesion_count")
+    pl.col("lesion_filled").sum().over(["file", *list_key_cols]).alias("lesion_count")
   ).filter(
     ((pl.col("LESION") == True) & (pl.col("lesion_count") == 0))
     | ((pl.col("LESION") == False) & (pl.col("lesion_count") > 0))
@@ -123,11 +110,9 @@ def _validate_r7(lf: pl.LazyFrame):
 def _validate_r8(lf: pl.LazyFrame):
   """
   Rule: Completeness check for lesion type, size and site - all must be filled if any one is filled.
+
+  Not-applicable codes are nulls, see `utils.normalize_df()`.
   """
-  # Because NA has no special meaning, it should be treated as null
-  # Force the data to go through convert_NA_into_nulls pipe if the REPLACE_NA setting is False
-  if REPLACE_NA is False:
-    lf = lf.pipe(convert_NA_into_nulls).pipe(compute_lesion_filled)
   return (
     lf.with_columns(
       pl.when(pl.col("type").is_not_null())
@@ -165,10 +150,13 @@ class ValidationLesion:
   validation_df_store = "lesion"
 
   validation_df_schema = {
+    "file": pl.Utf8,
     "DISTRICT": pl.Utf8,
     "LOCATION OF SCREENING": pl.Utf8,
     "DATESCREEN": pl.Date,
     "ICNUMBER": pl.Utf8,
+    "ic_key": pl.Int64,
+    "row_id": pl.UInt32,
     "lesion_id": pl.Utf8,
     "fail": pl.Struct(
       {"rule_number": pl.Int32, "rule": pl.Utf8, "data": pl.List(pl.Utf8)}
@@ -177,18 +165,51 @@ class ValidationLesion:
 
   def __init__(self, lf_general: pl.LazyFrame, file_name: str) -> None:
     # convert lf into long form
-    self.lf = (
-      lf_general.pipe(convert_into_lesion_lf)
-      .pipe(convert_NA_into_nulls)
-      .pipe(compute_lesion_filled)
-    )
+    self.lf = lf_general.pipe(convert_into_lesion_lf).pipe(compute_lesion_filled)
     self.file_name = file_name
-
-  def run_all(self):
+    # rules of functions invoked by `iter_lf()`
+    self.list_rule_run: list[RuleEnum] = []
+
+  def iter_lf(self, scope_cache: ScopeCache, list_func: list | None = None):
+    """Yields each validation function of `list_func` (default `list_all_func`) with
+    its output, invoked on rows of its scope. Functions that cannot fail are skipped,
+    see `ScopeCache.can_skip()`."""
+    for func in list_func or self.list_all_func:
+      if scope_cache.can_skip(func):
+        continue
+      self.list_rule_run.append(func.rule_enum)
+      yield func, scope_cache.run(func)
+
+  def run_all(self) -> pl.DataFrame:
+    """Runs all validation functions into store, returns failed datapoints of each rule.
+
+    Functions are run in order of measured cost, see `validate.scheduler`."""
+    scope_cache = ScopeCache(self.lf)
+    scheduler = RuleScheduler(self.validation_df_store)
     with ValidationStore(
-      self.validation_df_store, self.validation_df_schema, self.file_name
+      self.validation_df_store,
+      self.validation_df_schema,
+      self.file_name,
+      [func.rule_enum for func in self.list_all_func],
     ) as store_handler:
-      for func in self.list_all_func:
-        store_handler.extend_df(func(self.lf))
-
-logger.info(f"ValidationLesion run_all(): {len(ValidationLesion.list_all_func)} rules")
+      for func, lf in self.iter_lf(scope_cache, scheduler.order(self.list_all_func)):
+        time_start = time.perf_counter()
+        failed = store_handler.extend_df(lf)
+        scheduler.add(
+          func, scope_cache.df.height, time.perf_counter() - time_start, failed
+        )
+
+    scheduler.save()
+    return store_handler.get_count()
+
+  def collect_all(self) -> pl.DataFrame:
+    """Collects output of all validation functions, bypassing store."""
+    cols = list(self.validation_df_schema.keys())
+    return pl.concat(
+      [
+        pl.DataFrame(schema=self.validation_df_schema),
+        *pl.collect_all(
+          [lf.select(cols) for _, lf in self.iter_lf(ScopeCache(self.lf))]
+        ),
+      ]
+    )
@@ -4,15 +4,24 @@ from logging.handlers import RotatingFileHandler
 
 import yaml
 
-with open("config_log.yaml", "r") as f:
-  config = yaml.safe_load(f.read())
-  logging.config.dictConfig(config)
-
 logger = logging.getLogger("mainLogger")
-handler: RotatingFileHandler = logging.getHandlerByName("file")
 
-try:
-  handler.doRollover()
-except PermissionError:
-  # log file can still be in use due to notebook
-  logger.warning("doRollover failed - Log file still in use, probably by an active notebook.")
+
+def setup_logger():
+  """Configures `logger` from `config_log.yaml` and rolls over the log file.
+
+  Invoked by `python -m validate`, so that importing validate does not touch the log file.
+  """
+  with open("config_log.yaml", "r") as f:
+    config = yaml.safe_load(f.read())
+    logging.config.dictConfig(config)
+
+  handler: RotatingFileHandler = logging.getHandlerByName("file")
+
+  try:
+    handler.doRollover()
+  except PermissionError:
+    # log file can still be in use due to notebook
+    logger.warning(
+      "doRollover failed - Log file still in use, probably by an active notebook."
+    )
@@ -0,0 +1,126 @@
+import os
+from pathlib import Path
+
+import polars as pl
+import xlsxwriter
+
+from constants import dict_coded_values
+
+from .lesion_colmap import col_map
+
+PATH_STORE = os.getenv("PATH_STORE")
+PATH_OUTPUT = os.getenv("PATH_OUTPUT")
+
+# List: columns profiled by value counts - coded columns, lesion type and size
+list_value_cols = [
+  *dict_coded_values.keys(),
+  *[i.type for i in col_map],
+  *[i.size for i in col_map],
+]
+
+
+def get_profile(lf: pl.LazyFrame) -> dict[str, pl.DataFrame]:
+  """Profiles an ingested frame, by `file`.
+
+  The queries are collected together over the frame already loaded for validation:
+  * `columns`: rows and null count of every column
+  * `values`: value counts of `list_value_cols`
+  * `datescreen`: `DATESCREEN` range of each `DISTRICT`
+  """
+  value_cols = [col for col in list_value_cols if col in lf.columns]
+
+  list_lf = [
+    lf.group_by("file")
+    .agg(
+      pl.count().cast(pl.Int64).alias("rows"),
+      # is_null().sum(), null_count() panics on all-null columns in group_by
+      pl.all().exclude("file").is_null().sum().cast(pl.Int64),
+    )
+    .melt(id_vars=["file", "rows"], variable_name="column", value_name="nulls"),
+    lf.select("file", pl.col(value_cols).cast(pl.Utf8))
+    .melt(id_vars="file", variable_name="column", value_name="value")
+    .group_by("file", "column", "value")
+    .agg(pl.count().cast(pl.Int64).alias("count")),
+    lf.group_by("file", "DISTRICT").agg(
+      pl.col("DATESCREEN").min().alias("datescreen_min"),
+      pl.col("DATESCREEN").max().alias("datescreen_max"),
+      pl.count().cast(pl.Int64).alias("rows"),
+    ),
+  ]
+
+  return dict(zip(["columns", "values", "datescreen"], pl.collect_all(list_lf)))
+
+
+def write_profile(dict_profile: dict[str, pl.DataFrame]):
+  """Flush partial profiles into `store/profile/<name>`, a parquet file for each file."""
+  for name, df in dict_profile.items():
+    store_dir = Path(PATH_STORE).joinpath(f"profile/{name}")
+    store_dir.mkdir(parents=True, exist_ok=True)
+    for df_file in df.partition_by("file"):
+      df_file.write_parquet(store_dir.joinpath(f"{df_file['file'][0]}.parquet"))
+
+
+def compile_profile(clean_up: bool = True):
+  """Merges partial profiles in store across files into output.
+
+  Output: `profile.xlsx` with a sheet for each profile, and `profile_<name>.parquet`.
+
+  Parameters
+  ----------
+  clean_up
+      Remove partial profiles from store.
+  """
+  path_profile = Path(PATH_STORE).joinpath("profile")
+
+  if len(list(path_profile.glob("columns/*.parquet"))) == 0:
+    # remove stale output, e.g. run without profiling
+    for file_path in Path(PATH_OUTPUT).glob("profile*"):
+      os.unlink(file_path)
+    return
+
+  dict_lf = {
+    name: pl.scan_parquet(path_profile.joinpath(f"{name}/*.parquet"))
+    for name in ["columns", "values", "datescreen"]
+  }
+
+  dict_profile = dict(
+    zip(
+      dict_lf.keys(),
+      pl.collect_all(
+        [
+          dict_lf["columns"]
+          .group_by("column")
+          .agg(pl.col("rows", "nulls").sum())
+          .with_columns((pl.col("nulls") / pl.col("rows")).alias("null_rate"))
+          .sort("column"),
+          dict_lf["values"]
+          .group_by("column", "value")
+          .agg(pl.col("count").sum())
+          .sort(["column", "count"], descending=[False, True]),
+          dict_lf["datescreen"]
+          .group_by("DISTRICT")
+          .agg(
+            pl.col("datescreen_min").min(),
+            pl.col("datescreen_max").max(),
+            pl.col("rows").sum(),
+          )
+          .sort("DISTRICT"),
+        ]
+      ),
+    )
+  )
+
+  output_file = Path(PATH_OUTPUT).joinpath("profile.xlsx")
+  with xlsxwriter.Workbook(output_file) as wb:
+    for name, df in dict_profile.items():
+      df.write_excel(wb, worksheet=name, autofit=True)
+      df.write_parquet(Path(PATH_OUTPUT).joinpath(f"profile_{name}.parquet"))
+
+  print(f"Output saved as {output_file}")
+
+  if not clean_up:
+    return
+
+  # clean up store
+  for file_path in path_profile.glob("*/*.parquet"):
+    os.unlink(file_path)
@@ -0,0 +1,124 @@
+import os
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from pathlib import Path
+
+import polars as pl
+
+# Prometheus textfile for node-exporter's textfile collector, unset to disable
+PATH_METRICS = os.getenv("PATH_METRICS")
+
+list_stage = ["read", "profile", "general", "lesion", "store", "export"]
+
+
+def _get_size(path: Path) -> int:
+  """Size of `path`, 0 if removed since listed, e.g. while watching input."""
+  try:
+    return path.stat().st_size
+  except FileNotFoundError:
+    return 0
+
+
+class Progress:
+  """Progress of a run of `main()`, printed at every stage and exported as metrics.
+
+  ETA is estimated from the size of source files done over the elapsed time. If
+  `PATH_METRICS` is set, counters of rows validated, failures per rule and seconds per
+  stage are written into a Prometheus textfile after every stage.
+
+  Parameters
+  ----------
+  list_path
+      *.accdb files of the run.
+  """
+
+  def __init__(self, list_path: list[Path]):
+    self.dict_size = {path: _get_size(path) for path in list_path}
+    self.list_done: list[Path] = []
+    self.rows = 0
+    self.dict_stage_seconds = {stage: 0.0 for stage in list_stage}
+    # (store, rule_number, rule): failed
+    self.dict_failed: dict[tuple[str, int, str], int] = {}
+    self.time_start = time.perf_counter()
+
+  def add_rows(self, rows: int):
+    self.rows += rows
+
+  def add_failed(self, store: str, df_count: pl.DataFrame):
+    """Add failure counts of a store, as returned by `run_all()`."""
+    for rule_number, rule, failed in df_count.select(
+      "rule_number", "rule", "failed"
+    ).iter_rows():
+      key = (store, rule_number, rule)
+      self.dict_failed[key] = self.dict_failed.get(key, 0) + failed
+
+  def done(self, list_path: list[Path]):
+    self.list_done.extend(list_path)
+
+  @contextmanager
+  def stage(self, stage: str, name: str = ""):
+    """Context manager timing a stage of `list_stage`, `name` of file or batch."""
+    print(self._status(stage, name))
+    time_start = time.perf_counter()
+    try:
+      yield
+    finally:
+      self.dict_stage_seconds[stage] += time.perf_counter() - time_start
+      self.write_metrics()
+
+  def _status(self, stage: str, name: str) -> str:
+    elapsed = time.perf_counter() - self.time_start
+    size_total = sum(self.dict_size.values())
+    size_done = sum(self.dict_size[i] for i in self.list_done)
+
+    if size_done > 0 and len(self.list_done) < len(self.dict_size):
+      eta = timedelta(seconds=round(elapsed * (size_total - size_done) / size_done))
+    else:
+      eta = "-"
+
+    rate = self.rows / elapsed if elapsed > 0 else 0
+
+    return (
+      f"[{len(self.list_done)}/{len(self.dict_size)} files] {stage} {name}".rstrip()
+      + f" | {self.rows:,} rows | {rate:,.0f} rows/s | ETA {eta}"
+    )
+
+  def write_metrics(self):
+    """Write metrics into `PATH_METRICS`, atomically so that a scrape never reads a
+    partial file."""
+    if PATH_METRICS is None:
+      return
+
+    list_line = [
+      "# HELP validate_rows_total Rows validated.",
+      "# TYPE validate_rows_total counter",
+      f"validate_rows_total {self.rows}",
+      "# HELP validate_failures_total Failed datapoints by rule, before caps.",
+      "# TYPE validate_failures_total counter",
+    ]
+    for (store, rule_number, rule), failed in sorted(self.dict_failed.items()):
+      list_line.append(
+        f'validate_failures_total{{store="{store}",rule_number="{rule_number}",rule="{rule}"}} {failed}'
+      )
+    list_line += [
+      "# HELP validate_stage_seconds_total Seconds spent in each stage.",
+      "# TYPE validate_stage_seconds_total counter",
+    ]
+    for stage, seconds in self.dict_stage_seconds.items():
+      list_line.append(f'validate_stage_seconds_total{{stage="{stage}"}} {seconds:.3f}')
+    list_line += [
+      "# HELP validate_files Files of the run.",
+      "# TYPE validate_files gauge",
+      f'validate_files{{state="done"}} {len(self.list_done)}',
+      f'validate_files{{state="total"}} {len(self.dict_size)}',
+      "# HELP validate_last_update_timestamp_seconds Time of last update.",
+      "# TYPE validate_last_update_timestamp_seconds gauge",
+      f"validate_last_update_timestamp_seconds {time.time():.0f}",
+    ]
+
+    path = Path(PATH_METRICS)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp")
+    tmp_path.write_text("\n".join(list_line) + "\n")
+    os.replace(tmp_path, path)
@@ -0,0 +1,61 @@
+import os
+from functools import lru_cache
+from pathlib import Path
+
+import polars as pl
+
+from .logger import logger
+
+PATH_REFERENCE = os.getenv("PATH_REFERENCE")
+
+# master code lists, `<PATH_REFERENCE>/<name>.csv` with columns
+dict_reference_cols = {
+  "district": ["STATE", "DISTRICT"],
+  "location": ["DISTRICT", "LOCATION OF SCREENING"],
+}
+
+
+def code_expr(col: str) -> pl.Expr:
+  """Lookup key of column `col`, matched case-insensitively against reference data."""
+  return pl.col(col).str.strip_chars().str.to_uppercase()
+
+
+def prepare_reference(name: str, df: pl.DataFrame) -> pl.DataFrame:
+  """Selects columns of master code list `name` (`dict_reference_cols`) from `df`,
+  keyed by `code_expr()`, deduplicated and sorted."""
+  cols = dict_reference_cols[name]
+  return df.select([code_expr(col) for col in cols]).drop_nulls().unique().sort(cols)
+
+
+@lru_cache
+def get_reference(name: str) -> pl.DataFrame | None:
+  """Reads master code list `name` (`dict_reference_cols`) from `PATH_REFERENCE`.
+
+  Read once per process and shared across all files validated, see
+  `prepare_reference()`.
+
+  Returns None if `PATH_REFERENCE` is unset or the file does not exist, rules
+  depending on the reference are then skipped.
+  """
+  if PATH_REFERENCE is None:
+    return None
+
+  path = Path(PATH_REFERENCE).joinpath(f"{name}.csv")
+  if not path.exists():
+    logger.warning(f"Reference '{name}' not found: {path}")
+    return None
+
+  df = prepare_reference(
+    name,
+    pl.read_csv(path, columns=dict_reference_cols[name], infer_schema_length=0),
+  )
+
+  logger.info(f"Reference '{name}' loaded: {df.height} rows")
+  return df
+
+
+def get_dict_reference() -> dict[str, pl.DataFrame]:
+  """Master code lists available in `PATH_REFERENCE`, by name."""
+  return {
+    name: df for name in dict_reference_cols if (df := get_reference(name)) is not None
+  }
@@ -0,0 +1,114 @@
+import os
+from pathlib import Path
+
+import polars as pl
+
+from constants import list_key_cols
+
+PATH_STORE = os.getenv("PATH_STORE")
+PATH_OUTPUT = os.getenv("PATH_OUTPUT")
+
+# List: dimensions of the rollup cube
+list_cube_cols = ["DISTRICT", "LOCATION OF SCREENING", "month"]
+
+
+def _with_month(df: pl.DataFrame | pl.LazyFrame):
+  """Add `month` column - `DATESCREEN` truncated to the first day of month."""
+  return df.with_columns(pl.col("DATESCREEN").dt.truncate("1mo").alias("month"))
+
+
+def get_screened_cube(lf: pl.LazyFrame) -> pl.DataFrame:
+  """Count records screened by `list_cube_cols`."""
+  return (
+    lf.pipe(_with_month)
+    .group_by(list_cube_cols)
+    .agg(pl.count().cast(pl.Int64).alias("screened"))
+    .collect()
+  )
+
+
+def get_failed_cube(df: pl.DataFrame) -> pl.DataFrame:
+  """Count records failing each rule by `list_cube_cols`.
+
+  `df` is a frame collected by `ValidationStore.extend_df()`. A record (`row_id`) is
+  counted once per rule, e.g. a subject failing a lesion rule on two lesions counts
+  as 1.
+  """
+  # eager, `df` is in memory
+  df_failed = df.select(
+    pl.col("file", "row_id"),
+    pl.col(list_key_cols),
+    pl.col("fail").struct.field("rule_number"),
+    pl.col("fail").struct.field("rule"),
+  )
+  # general rules yield a row per record, lesion rules a row per lesion
+  if "lesion_id" in df.columns:
+    df_failed = df_failed.unique(subset=["file", "row_id", "rule_number"])
+
+  return (
+    df_failed.pipe(_with_month)
+    .group_by([*list_cube_cols, "rule_number", "rule"])
+    .agg(pl.count().cast(pl.Int64).alias("failed"))
+  )
+
+
+def write_rollup(df: pl.DataFrame, rollup_name: str, file_name: str):
+  """Flush a partial cube of a single file into `store/rollup/<rollup_name>`."""
+  if df.is_empty():
+    return
+
+  store_dir = Path(PATH_STORE).joinpath(f"rollup/{rollup_name}")
+  store_dir.mkdir(parents=True, exist_ok=True)
+  df.write_parquet(store_dir.joinpath(f"{file_name}.parquet"))
+
+
+def compile_rollup(clean_up: bool = True):
+  """Merges partial cubes in store into the summary cube in output.
+
+  Output: `validation_summary.parquet` and `validation_summary.xlsx`, with failure
+  counts of each rule and failure rate against records screened.
+
+  Parameters
+  ----------
+  clean_up
+      Remove partial cubes from store.
+  """
+  path_rollup = Path(PATH_STORE).joinpath("rollup")
+  list_screened = list(path_rollup.glob("screened/*.parquet"))
+  list_failed = [
+    i for i in path_rollup.glob("*/*.parquet") if i.parent.name != "screened"
+  ]
+
+  if len(list_screened) > 0 and len(list_failed) > 0:
+    lf_screened = (
+      pl.concat([pl.scan_parquet(i) for i in list_screened])
+      .group_by(list_cube_cols)
+      .agg(pl.col("screened").sum())
+    )
+
+    df = (
+      pl.concat([pl.scan_parquet(i) for i in list_failed])
+      .group_by([*list_cube_cols, "rule_number", "rule"])
+      .agg(pl.col("failed").sum())
+      .join(lf_screened, on=list_cube_cols, how="left")
+      .with_columns((pl.col("failed") / pl.col("screened")).alias("failure_rate"))
+      .sort([*list_cube_cols, "rule_number"])
+      .collect()
+    )
+
+    output_file = Path(PATH_OUTPUT).joinpath("validation_summary.parquet")
+    df.write_parquet(output_file)
+    df.write_excel(output_file.with_suffix(".xlsx"), autofit=True)
+
+    print(f"Output saved as {output_file.with_suffix('.xlsx')}")
+  else:
+    # remove stale output, e.g. all files removed from input in watch mode
+    for file_path in Path(PATH_OUTPUT).glob("validation_summary.*"):
+      os.unlink(file_path)
+
+  if not clean_up:
+    return
+
+  # clean up store
+  for file_path in path_rollup.glob("*/*.parquet"):
+    os.unlink(file_path)
@@ -0,0 +1,226 @@
+import os
+from pathlib import Path
+
+import polars as pl
+
+import utils
+from constants import RuleEnum, list_required_cols
+
+from .api import _validate_frame
+from .lesion_colmap import list_lesion_cols
+from .reference import get_dict_reference
+
+PATH_INPUT = os.getenv("PATH_INPUT")
+PATH_OUTPUT = os.getenv("PATH_OUTPUT")
+
+z = 1.96  # 95% confidence interval
+
+# rules on a file as a whole, without a failure rate of rows
+list_file_rule = [RuleEnum.FILE_STATE_DISTRICT_COMBINATION]
+
+
+def _stratum_expr(stratify: bool) -> pl.Expr:
+  """Stratum of a row: `DISTRICT` if `stratify`, otherwise `(all)`.
+
+  Normalised as in `utils.normalize_df()`, so that raw and validated rows map to the
+  same stratum. Null `DISTRICT` is a stratum of its own, `(null)`, as null keys do
+  not match in joins.
+  """
+  if not stratify:
+    return pl.lit("(all)")
+  return pl.col("DISTRICT").str.strip_chars().replace("", None).fill_null("(null)")
+
+
+def get_sample(
+  df: pl.DataFrame, fraction: float, stratify: bool = False, seed: int | None = None
+) -> pl.DataFrame:
+  """Draws a simple random sample of `df` without replacement.
+
+  If `stratify` is True, the sample is drawn within each `DISTRICT`, at least one row
+  per district, rows with null `DISTRICT` in stratum `(null)`.
+
+  Add columns: stratum, population (number of rows of stratum in `df`).
+  """
+  return (
+    df.with_columns(_stratum_expr(stratify).alias("stratum"))
+    .with_columns(pl.count().over("stratum").alias("population"))
+    .filter(
+      pl.int_range(0, pl.count()).shuffle(seed=seed).over("stratum")
+      < (pl.col("population").cast(pl.Float64) * fraction).ceil()
+    )
+  )
+
+
+def _collect_failed(
+  df: pl.DataFrame, dict_reference: dict[str, pl.DataFrame]
+) -> tuple[pl.DataFrame, list[RuleEnum]]:
+  """Validates `df` in memory, returns number of failed records for each rule, and
+  rules run, except `list_file_rule`."""
+  df_failed, list_rule_run = _validate_frame(df, dict_reference)
+  df_failed = (
+    df_failed.select(
+      pl.col("DISTRICT", "row_id"),
+      pl.col("fail").struct.field("rule_number"),
+    )
+    # a record failing a lesion rule on several lesions is counted once
+    .unique(subset=["row_id", "rule_number"])
+    .group_by("DISTRICT", "rule_number")
+    .agg(pl.count().cast(pl.Int64).alias("failed"))
+  )
+  return df_failed, [i for i in list_rule_run if i not in list_file_rule]
+
+
+def get_rules(file: str, list_rule: list[RuleEnum]) -> pl.DataFrame:
+  """Frame of rules `list_rule` run on `file`, as `df_rules` of `estimate()`."""
+  return pl.DataFrame(
+    {
+      "file": file,
+      "rule_number": [i.value for i in list_rule],
+      "rule": [i.name for i in list_rule],
+    },
+    schema={"file": pl.Utf8, "rule_number": pl.Int32, "rule": pl.Utf8},
+  )
+
+
+def estimate(
+  df_strata: pl.DataFrame,
+  df_failed: pl.DataFrame,
+  df_rules: pl.DataFrame,
+  by: list[str],
+):
+  """Estimates failure rate of each rule with confidence interval.
+
+  The rate is the stratified estimate weighted by stratum population, with finite
+  population correction. The interval is the Wilson score interval using the
+  effective sample size of the stratified design. A rule is estimated over files it
+  was run on, rules not run are left out.
+
+  Parameters
+  ----------
+  df_strata
+      Columns: file, stratum, population, sampled.
+  df_failed
+      Columns: file, stratum, rule_number, failed.
+  df_rules
+      Rules run on each file, columns: file, rule_number, rule, see `get_rules()`.
+  by
+      Columns to estimate by, e.g. `["file"]` for each file, `[]` for all files.
+  """
+  n_eff = pl.col("rate") * (1 - pl.col("rate")) / pl.col("variance")
+  n_eff = pl.when(pl.col("variance") > 0).then(n_eff).otherwise(pl.col("sampled"))
+  center = (pl.col("rate") + z**2 / (2 * pl.col("n_eff"))) / (
+    1 + z**2 / pl.col("n_eff")
+  )
+  half_width = (
+    z
+    * (
+      pl.col("rate") * (1 - pl.col("rate")) / pl.col("n_eff")
+      + z**2 / (4 * pl.col("n_eff") ** 2)
+    ).sqrt()
+    / (1 + z**2 / pl.col("n_eff"))
+  )
+
+  return (
+    df_strata.lazy()
+    .join(df_rules.lazy(), on="file")
+    .join(df_failed.lazy(), on=["file", "stratum", "rule_number"], how="left")
+    .with_columns(
+      pl.col("failed").fill_null(0),
+      (
+        pl.col("population") / pl.col("population").sum().over([*by, "rule_number"])
+      ).alias("weight"),
+    )
+    .with_columns((pl.col("failed") / pl.col("sampled")).alias("stratum_rate"))
+    .group_by([*by, "rule_number", "rule"])
+    .agg(
+      pl.col("population").sum(),
+      pl.col("sampled").sum(),
+      pl.col("failed").sum(),
+      (pl.col("weight") * pl.col("stratum_rate")).sum().alias("rate"),
+      (
+        pl.col("weight") ** 2
+        * pl.col("stratum_rate")
+        * (1 - pl.col("stratum_rate"))
+        / pl.col("sampled")
+        * (1 - pl.col("sampled") / pl.col("population"))
+      )
+      .sum()
+      .alias("variance"),
+    )
+    .with_columns(n_eff.alias("n_eff"))
+    .with_columns(
+      (center - half_width).clip(0, 1).alias("ci_low"),
+      (center + half_width).clip(0, 1).alias("ci_high"),
+    )
+    .drop("variance", "n_eff")
+    .sort([*by, "rule_number"])
+    .collect()
+  )
+
+
+def run_sample(fraction: float, stratify: bool = False, seed: int | None = None):
+  """Validates a sample of rows of each *.accdb file in input.
+
+  Estimated failure rates of each rule are printed, and saved as
+  `sample_estimate.xlsx` in output, for each file and for all files `(all)`.
+
+  If `PATH_CACHE` is set, files are read from the memory-mapped cache instead of
+  through ODBC on later runs. The whole file is loaded, only sampled rows are
+  validated.
+  """
+  list_strata = []
+  list_failed = []
+  list_rules = []
+  dict_reference = get_dict_reference()
+
+  for path in Path(PATH_INPUT).glob("*.accdb"):
+    print(f"Sampling '{path.stem}'")
+    try:
+      rename = utils.preflight(path, [*list_required_cols, *list_lesion_cols])
+    except utils.PreflightError as e:
+      print(e)
+      continue
+
+    df = get_sample(utils.get_df(path, rename=rename), fraction, stratify, seed)
+
+    list_strata.append(
+      df.group_by("stratum").agg(
+        pl.lit(path.stem).alias("file"),
+        pl.col("population").first().cast(pl.Int64),
+        pl.count().cast(pl.Int64).alias("sampled"),
+      )
+    )
+
+    df_failed, list_rule_run = _collect_failed(
+      df.drop("stratum", "population"), dict_reference
+    )
+    list_rules.append(get_rules(path.stem, list_rule_run))
+    list_failed.append(
+      df_failed.select(
+        pl.lit(path.stem).alias("file"),
+        _stratum_expr(stratify).alias("stratum"),
+        pl.all().exclude("DISTRICT"),
+      )
+      .group_by("file", "stratum", "rule_number")
+      .agg(pl.col("failed").sum())
+    )
+
+  if len(list_strata) == 0:
+    return
+
+  df_strata = pl.concat(list_strata).select("file", "stratum", "population", "sampled")
+  df_failed = pl.concat(list_failed)
+  df_rules = pl.concat(list_rules)
+
+  df_all = estimate(df_strata, df_failed, df_rules, by=[])
+  df_file = estimate(df_strata, df_failed, df_rules, by=["file"])
+
+  with pl.Config(tbl_rows=len(RuleEnum), fmt_str_lengths=50):
+    print(df_all.select("rule", "sampled", "failed", "rate", "ci_low", "ci_high"))
+
+  output_file = Path(PATH_OUTPUT).joinpath("sample_estimate.xlsx")
+  pl.concat(
+    [df_all.select(pl.lit("(all)").alias("file"), pl.all()), df_file]
+  ).write_excel(output_file, autofit=True)
+
+  print(f"Output saved as {output_file}")
@@ -0,0 +1,119 @@
+import os
+import tempfile
+from functools import lru_cache
+from pathlib import Path
+
+import polars as pl
+
+from .workqueue import worker_id
+
+PATH_STORE = os.getenv("PATH_STORE")
+
+schema_stats = {
+  "store": pl.Utf8,
+  "func": pl.Utf8,
+  "rows": pl.Int64,
+  "seconds": pl.Float64,
+  "failed": pl.Int64,
+}
+
+
+def _get_stats_dir() -> Path:
+  return Path(PATH_STORE).joinpath("rule_stats")
+
+
+def _get_worker_path() -> Path:
+  """Stats file of this process, written by no other worker."""
+  return _get_stats_dir().joinpath(f"{worker_id.replace(':', '_')}.parquet")
+
+
+def _sum_stats(df: pl.DataFrame) -> pl.DataFrame:
+  return df.group_by("store", "func").agg(pl.col("rows", "seconds", "failed").sum())
+
+
+def _write_stats(df: pl.DataFrame, path: Path):
+  """Writes `df` into `path` atomically, so that readers never see a partial file."""
+  path.parent.mkdir(parents=True, exist_ok=True)
+  fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+  os.close(fd)
+  df.write_parquet(tmp_path)
+  os.replace(tmp_path, path)
+
+
+@lru_cache
+def _read_stats() -> pl.DataFrame:
+  """Stats of previous runs across all workers, read once per process."""
+  if not any(_get_stats_dir().glob("*.parquet")):
+    return pl.DataFrame(schema=schema_stats)
+
+  return _sum_stats(
+    pl.read_parquet(_get_stats_dir().joinpath("*.parquet")).select(
+      list(schema_stats.keys())
+    )
+  )
+
+
+def compact_stats():
+  """Sums stats files of all workers into a single file, after all workers are done."""
+  list_path = list(_get_stats_dir().glob("*.parquet"))
+  if len(list_path) <= 1:
+    return
+
+  df_stats = _sum_stats(pl.read_parquet(_get_stats_dir().joinpath("*.parquet")))
+  for file_path in list_path:
+    os.unlink(file_path)
+  _write_stats(df_stats, _get_stats_dir().joinpath("compacted.parquet"))
+
+
+class RuleScheduler:
+  """Schedules validation functions of a store by cost and selectivity measured in
+  previous runs.
+
+  Functions run in order of seconds per row, then of failure rate (failed / rows),
+  highest first. Functions without measured cost run first, in their original order.
+  Cost is measured with `add()` and persisted by `save()` into
+  `store/rule_stats/<worker>.parquet`, a file for each worker process, so that
+  workers sharing the store never write the same file. Files are summed into one by
+  `compact_stats()`.
+
+  Reported failures do not depend on the order, see `ValidationStore`.
+
+  Parameters
+  ----------
+  store
+      Name of validation store, e.g. `general`.
+  """
+
+  def __init__(self, store: str):
+    self.store = store
+    self.dict_rank = {
+      func: (seconds / rows, -failed / rows)
+      for func, rows, seconds, failed in _read_stats()
+      .filter((pl.col("store") == store) & (pl.col("rows") > 0))
+      .select("func", "rows", "seconds", "failed")
+      .iter_rows()
+    }
+    self.list_measured: list[tuple[str, int, float, int]] = []
+
+  def order(self, list_func: list) -> list:
+    return sorted(
+      list_func, key=lambda func: self.dict_rank.get(func.__name__, (0.0, 0.0))
+    )
+
+  def add(self, func, rows: int, seconds: float, failed: int):
+    """Records cost of function `func` invoked on `rows` rows."""
+    self.list_measured.append((func.__name__, rows, seconds, failed))
+
+  def save(self):
+    """Adds measured cost into the stats file of this worker."""
+    if len(self.list_measured) == 0:
+      return
+
+    df_measured = pl.DataFrame(
+      [(self.store, *i) for i in self.list_measured], schema=schema_stats
+    )
+    path = _get_worker_path()
+    if path.exists():
+      df_measured = pl.concat([pl.read_parquet(path), df_measured])
+
+    _write_stats(_sum_stats(df_measured), path)
@@ -6,8 +6,14 @@ import polars as pl
 
 from constants import RuleEnum
 
+from .rollup import get_failed_cube, write_rollup
+
 PATH_STORE = os.getenv("PATH_STORE")
 
+# caps of rows stored for each rule and for each file, unset or 0 for no cap
+FAIL_CAP_RULE = int(os.getenv("FAIL_CAP_RULE") or 0)
+FAIL_CAP_FILE = int(os.getenv("FAIL_CAP_FILE") or 0)
+
 
 def store_data(rule_enum: RuleEnum, cols_as_data: list[str] = []):
   """Decorator for validation functions to wrap store data.
@@ -23,8 +29,8 @@ def store_data(rule_enum: RuleEnum, cols_as_data: list[str] = []):
 
   def decorator(func):
     @wraps(func)
-    def wrapper(lf: pl.LazyFrame):
-      result = func(lf)
+    def wrapper(lf: pl.LazyFrame, *args):
+      result = func(lf, *args)
 
       assert (
         type(result) == pl.LazyFrame
@@ -43,11 +49,17 @@ def store_data(rule_enum: RuleEnum, cols_as_data: list[str] = []):
         ).alias("fail"),
       )
 
+    wrapper.rule_enum = rule_enum
     return wrapper
 
   return decorator
 
 
+def _head_by_file(df: pl.DataFrame, n: int) -> pl.DataFrame:
+  """Keep first `n` rows of each file."""
+  return df.filter(pl.int_range(0, pl.count()).over("file") < n)
+
+
 class ValidationStore:
   """Context manager for validation parquet store.
 
@@ -55,40 +67,135 @@ class ValidationStore:
 
   Upon entering, a dataframe (self.df) is created to log validation results.
 
-  Upon exiting, `self.df` will be flushed as parquet into the store.
+  Upon exiting, `self.df` will be flushed as parquet into the store, a parquet file for
+  each value of the `file` column, together with its partial rollup cube
+  (`validate.rollup`).
+
+  Rows stored are capped by `FAIL_CAP_RULE` for each rule and `FAIL_CAP_FILE` for each
+  file, first rows are kept, with rules in order of `list_rule_enum` whatever order
+  they were run in (`validate.scheduler`). Exact failure counts are kept in the rollup cube, and
+  rules exceeding a cap are flushed into `store/systemic`.
   """
 
-  def __init__(self, store: str, validation_df_schema: dict, file_name: str):
+  def __init__(
+    self,
+    store: str,
+    validation_df_schema: dict,
+    file_name: str,
+    list_rule_enum: list[RuleEnum] | None = None,
+  ):
     self.store = store
     self.file_name = file_name
     self.df = pl.DataFrame(schema=validation_df_schema)
     self.cols = [col for col in validation_df_schema.keys()]
+    self.dict_position = {
+      rule_enum.value: i for i, rule_enum in enumerate(list_rule_enum or [])
+    }
+    # output of each rule, concatenated into `self.df` on exit
+    self.list_df: list[pl.DataFrame] = []
+    self.list_rollup: list[pl.DataFrame] = []
+    self.list_count: list[pl.DataFrame] = []
 
   def __enter__(self):
     return self
 
   def __exit__(self, exc_type, exc_value, exc_traceback):
-    if self.df.is_empty():
+    if len(self.list_df) == 0:
       return
 
-    self.df.rechunk().select(  # wrap file name as first column
-      pl.lit(self.file_name).alias("file"),
-      pl.all(),
-    ).write_parquet(  # flush self.df into parquet file
-      Path(PATH_STORE).joinpath(f"{self.store}/{self.file_name}.parquet"),
-      compression="lz4",
+    # outputs are ordered by rule, not sorted by row, stable for rules not listed
+    self.df = pl.concat(
+      [self.df, *sorted(self.list_df, key=self._get_position)], how="vertical"
     )
 
-  def extend_df(self, lf: pl.LazyFrame):
+    write_rollup(pl.concat(self.list_rollup), self.store, self.file_name)
+
+    if FAIL_CAP_FILE > 0:
+      self.df = _head_by_file(self.df, FAIL_CAP_FILE)
+
+    self._write_systemic()
+
+    for df_file in self.df.partition_by("file"):
+      df_file.write_parquet(  # flush self.df into parquet file
+        Path(PATH_STORE).joinpath(f"{self.store}/{df_file['file'][0]}.parquet"),
+        compression="lz4",
+      )
+
+  def _get_position(self, df: pl.DataFrame) -> int:
+    rule_number = df["fail"].struct.field("rule_number")[0]
+    return self.dict_position.get(rule_number, len(self.dict_position))
+
+  def _write_systemic(self):
+    """Flush counts of rules with rows truncated by caps into `store/systemic`."""
+    df_stored = self.df.group_by(
+      "file", pl.col("fail").struct.field("rule_number")
+    ).agg(pl.count().cast(pl.Int64).alias("stored"))
+
+    df_systemic = (
+      pl.concat(self.list_count)
+      .join(df_stored, on=["file", "rule_number"], how="left")
+      .with_columns(pl.col("stored").fill_null(0))
+      .filter(pl.col("stored") < pl.col("failed"))
+    )
+
+    if df_systemic.is_empty():
+      return
+
+    store_dir = Path(PATH_STORE).joinpath(f"systemic/{self.store}")
+    store_dir.mkdir(parents=True, exist_ok=True)
+    for df_file in df_systemic.partition_by("file"):
+      df_file.select(
+        "file",
+        pl.lit(self.store).alias("store"),
+        pl.all().exclude("file"),
+      ).write_parquet(store_dir.joinpath(f"{df_file['file'][0]}.parquet"))
+
+  def get_count(self) -> pl.DataFrame:
+    """Failed datapoints of each rule, before caps."""
+    if len(self.list_count) == 0:
+      return pl.DataFrame(
+        schema={"rule_number": pl.Int32, "rule": pl.Utf8, "failed": pl.Int64}
+      )
+
+    return (
+      pl.concat(self.list_count)
+      .group_by("rule_number", "rule")
+      .agg(pl.col("failed").sum())
+      .sort("rule_number")
+    )
+
+  def extend_df(self, lf: pl.LazyFrame) -> int:
+    """Collects output `lf` of a validation function, returns its failed rows."""
     try:
       # wrap the lf with select columns required by validation_df_schema
       # collect
       new_output = lf.select(self.cols).collect()
-      # concat
-      self.df = pl.concat([self.df, new_output], how="vertical")
 
       if new_output.is_empty():
-        return
+        return 0
+
+      failed = new_output.height
+
+      # aggregate while the output is in memory, the store is never re-scanned for rollup
+      self.list_rollup.append(get_failed_cube(new_output))
+      self.list_count.append(
+        new_output.select(
+          "file",
+          pl.col("fail").struct.field("rule_number"),
+          pl.col("fail").struct.field("rule"),
+        )
+        .group_by("file")
+        .agg(
+          pl.col("rule_number", "rule").first(),
+          pl.count().cast(pl.Int64).alias("failed"),
+        )
+      )
+
+      if FAIL_CAP_RULE > 0:
+        new_output = _head_by_file(new_output, FAIL_CAP_RULE)
+
+      self.list_df.append(new_output)
+      return failed
     except Exception as e:
       msg = (
         f"Unhandled exception in validate.store.extend_df(), filename: {self.file_name}"
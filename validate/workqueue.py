@@ -0,0 +1,151 @@
+import os
+import socket
+import threading
+import time
+from pathlib import Path
+
+PATH_STORE = os.getenv("PATH_STORE")
+
+# seconds without heartbeat after which a lease is taken over by another worker
+LEASE_TIMEOUT = float(os.getenv("LEASE_TIMEOUT") or 300)
+
+worker_id = f"{socket.gethostname()}:{os.getpid()}"
+
+
+def get_queue_dir() -> Path:
+  """Directory of lease files and done markers, in the shared store."""
+  return Path(PATH_STORE).joinpath("queue")
+
+
+def get_fingerprint(path: Path) -> str:
+  """Key of a version of input file `path`, by its mtime and size."""
+  stat = path.stat()
+  return f"{path.stem}_{stat.st_mtime_ns}_{stat.st_size}"
+
+
+def is_done(path: Path) -> bool:
+  """If the current version of `path` has been validated by a worker."""
+  return get_queue_dir().joinpath(f"{get_fingerprint(path)}.done").exists()
+
+
+def clear_queue():
+  """Removes all lease files and done markers, after results are merged."""
+  for file_path in get_queue_dir().glob("*"):
+    os.unlink(file_path)
+
+
+class Lease:
+  """Context manager for the lease of a single input file, claimed by one worker.
+
+  A lease file `<fingerprint>.lease` is created exclusively in `get_queue_dir()`, so
+  that only one worker claims a file. While the lease is held, its mtime is touched
+  by a heartbeat thread. A lease without heartbeat for `LEASE_TIMEOUT` seconds is
+  stale, its worker is assumed dead and the file is claimed by another worker.
+
+  Usage:
+  ```
+  lease = Lease(path)
+  if lease.acquire():
+    with lease:
+      ...
+      lease.mark_done()
+  ```
+  """
+
+  def __init__(self, path: Path):
+    self.path = path
+    self.fingerprint = get_fingerprint(path)
+    self.lease_path = get_queue_dir().joinpath(f"{self.fingerprint}.lease")
+    self._stop = threading.Event()
+    self._thread = threading.Thread(target=self._heartbeat, daemon=True)
+
+  def acquire(self) -> bool:
+    """Claims the file, True if claimed by this worker."""
+    get_queue_dir().mkdir(parents=True, exist_ok=True)
+
+    if self._create():
+      return True
+
+    if not self._take_over():
+      return False
+
+    return self._create()
+
+  def _create(self) -> bool:
+    try:
+      fd = os.open(self.lease_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+      return False
+
+    with os.fdopen(fd, "w") as f:
+      f.write(worker_id)
+    return True
+
+  def _is_stale(self, path: Path) -> bool:
+    try:
+      return time.time() - path.stat().st_mtime > LEASE_TIMEOUT
+    except FileNotFoundError:
+      return False
+
+  def _take_over(self) -> bool:
+    """Removes a stale lease, True if removed by this worker."""
+    if not self._is_stale(self.lease_path):
+      return False
+
+    # rename is atomic, only one worker moves the stale lease away
+    stale_path = self.lease_path.with_name(
+      f"{self.lease_path.name}.{worker_id.replace(':', '_')}"
+    )
+    try:
+      os.rename(self.lease_path, stale_path)
+    except FileNotFoundError:
+      return False
+
+    if not self._is_stale(stale_path):
+      # lease was renewed by another worker in the meantime, restore it
+      try:
+        os.link(stale_path, self.lease_path)
+      except FileExistsError:
+        pass
+      os.unlink(stale_path)
+      return False
+
+    os.unlink(stale_path)
+    return True
+
+  def is_owner(self) -> bool:
+    """If the lease file is held by this worker."""
+    try:
+      return self.lease_path.read_text() == worker_id
+    except FileNotFoundError:
+      return False
+
+  def _heartbeat(self):
+    while not self._stop.wait(LEASE_TIMEOUT / 4):
+      # the lease is briefly missing while another worker restores it, see
+      # `_take_over()`, keep beating until stopped
+      if not self.is_owner():
+        continue
+      try:
+        os.utime(self.lease_path)
+      except FileNotFoundError:
+        pass
+
+  def mark_done(self):
+    """Writes done marker of the current version of the file, removes markers of
+    previous versions."""
+    for done_path in get_queue_dir().glob(f"{self.path.stem}_*.done"):
+      if done_path.stem.rsplit("_", 2)[0] == self.path.stem:
+        os.unlink(done_path)
+
+    get_queue_dir().joinpath(f"{self.fingerprint}.done").write_text(worker_id)
+
+  def __enter__(self):
+    self._thread.start()
+    return self
+
+  def __exit__(self, exc_type, exc_value, exc_traceback):
+    self._stop.set()
+    self._thread.join()
+    if self.is_owner():
+      self.lease_path.unlink(missing_ok=True)